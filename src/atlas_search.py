@@ -0,0 +1,52 @@
+"""
+The Atlas $vectorSearch query, shared by every search path: main.py (sync and
+AsyncRecommender), the Streamlit UI, suggest_service and bulk_insertion.
+
+Results are lean by default, {id, text, score}. With include_vectors the
+stored embedding is projected as well and decoded by vector_codec into a
+plain list, the same shape vector_index.query returns.
+"""
+import os
+
+import vector_codec
+
+# must match your Atlas vector index name
+VECTOR_SEARCH_INDEX = os.getenv("vector_search_index", "vector_index_embeddings_key")
+CANDIDATES_PER_RESULT = 20   # numCandidates = limit * this; more is slower but recalls better
+
+def pipeline(vec, limit: int, include_vectors: bool = False, index: str = None,
+             candidates_per_result: int = CANDIDATES_PER_RESULT):
+    project = {
+        "_id": 0,
+        "id": {"$toString": "$_id"},
+        "text": 1,
+        "score": {"$meta": "vectorSearchScore"}
+    }
+    if include_vectors:
+        # full vectors multiply the payload and BSON decode cost, only ship them on request
+        project["embedding"] = 1
+        project["codec"] = 1
+    return [
+        {
+            "$vectorSearch": {
+                "index": index or VECTOR_SEARCH_INDEX,
+                "path": "embedding",   # name of the indexed document field
+                "queryVector": vec,
+                "numCandidates": limit * candidates_per_result,
+                "limit": limit
+            }
+        },
+        {"$project": project}
+    ]
+
+def _finish(hits, include_vectors: bool):
+    return vector_codec.decode_hits(hits) if include_vectors else hits
+
+def query(coll, vec, limit: int, include_vectors: bool = False, **kwargs):
+    hits = list(coll.aggregate(pipeline(vec, limit, include_vectors, **kwargs)))
+    return _finish(hits, include_vectors)
+
+async def query_async(coll, vec, limit: int, include_vectors: bool = False, **kwargs):
+    # query() for a motor collection
+    hits = await coll.aggregate(pipeline(vec, limit, include_vectors, **kwargs)).to_list(length=limit)
+    return _finish(hits, include_vectors)
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the embedding / search stack.
+Run from the src folder, e.g.
+
+    python benchmarks.py encode --device cpu --batch-sizes 1 8 32 128
+    python benchmarks.py onnx
+    python benchmarks.py scheduler --budget-ms 150
+    python benchmarks.py result-shape [--live]
+    python benchmarks.py pool --processes 1 2 4
+    python benchmarks.py prefix -n 50000
+    python benchmarks.py eval
+    python benchmarks.py service --url http://127.0.0.1:8000 --concurrency 1 8 32
+"""
+import argparse
+import random
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import embedding_generator
+
+# ----------------------------
+# sample data
+# ----------------------------
+_WORDS = ("iron man captain america thor hulk widow hawkeye wakanda vibranium "
+          "infinity stones quantum realm shield asgard portal suit battle team "
+          "universe threat hero mission lightning hammer city strategy").split()
+
+def sample_texts(n: int):
+    # prefer the real corpus when it is around, pad with synthetic sentences
+    path = Path(__file__).parent / "raw_text" / "avengers.txt"
+    texts = []
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:n]
+    rng = random.Random(42)
+    while len(texts) < n:
+        texts.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 14))).capitalize() + ".")
+    return texts
+
+def _best_of(fn, repeats: int):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# ----------------------------
+# encode throughput (sentences/sec per batch size)
+# ----------------------------
+def bench_encode(device: str, batch_sizes, n: int, repeats: int):
+    embedding_generator._model = embedding_generator.load_model(device)
+    texts = sample_texts(n)
+    # warm up kernels / allocator before timing
+    embedding_generator.get_embeddings(texts[:32])
+
+    print(f"device={embedding_generator.resolve_device(device)} "
+          f"threads={embedding_generator.torch.get_num_threads()} sentences={n}")
+    print(f"{'batch':>6} {'seconds':>9} {'sent/s':>9}")
+    for bs in batch_sizes:
+        secs = _best_of(lambda: embedding_generator.get_embeddings(texts, batch_size=bs), repeats)
+        print(f"{bs:>6} {secs:>9.3f} {n / secs:>9.1f}")
+
+# ----------------------------
+# backend comparison: torch vs onnx vs onnx-int8 on CPU
+# ----------------------------
+def bench_backends(n: int, queries: int):
+    import onnx_encoder
+
+    texts = sample_texts(n)
+    reference = embedding_generator.load_model("cpu", "torch")
+    for quantized in (False, True):
+        cos = onnx_encoder.parity_check(texts[:64], quantized=quantized, reference=reference)
+        print(f"parity onnx{'-int8' if quantized else ''}: min cosine {cos.min():.4f}, mean {cos.mean():.4f}")
+
+    # single short queries, as typed into the search box
+    probes = [t[:3 + i % 24] for i, t in enumerate(sample_texts(queries))]
+    print(f"{'backend':>10} {'p50 ms':>8} {'p99 ms':>8} {'sent/s':>9}")
+    for backend in embedding_generator.BACKENDS:
+        model = reference if backend == "torch" else embedding_generator.load_model("cpu", backend)
+        model.encode(probes[:8], normalize_embeddings=True)  # warm up
+        lat = []
+        for q in probes:
+            start = time.perf_counter()
+            model.encode(q, normalize_embeddings=True)
+            lat.append((time.perf_counter() - start) * 1000)
+        secs = _best_of(lambda: model.encode(texts, batch_size=64, normalize_embeddings=True), 2)
+        print(f"{backend:>10} {np.percentile(lat, 50):>8.2f} {np.percentile(lat, 99):>8.2f} {n / secs:>9.1f}")
+
+# ----------------------------
+# query scheduler: model/DB calls per typed character
+# ----------------------------
+def bench_scheduler(budget_ms: float, sessions: int, work_ms: float, seed: int = 7):
+    """
+    Models what the Streamlit UI actually does: st_keyup debounces in the
+    browser (a value is sent once the typist pauses for budget_ms), and
+    Streamlit runs one session's reruns one at a time, starting the next
+    with the newest value only. The scheduler then only coalesces identical
+    queries across sessions.
+    """
+    import query_scheduler
+
+    scheduler = query_scheduler.QueryScheduler(budget_ms=0)
+    budget = budget_ms / 1000.0
+    rng = random.Random(seed)
+    # half the sessions type the same popular query, the rest their own
+    popular = sample_texts(1)[0][:24]
+    targets = [popular if i % 2 == 0 else t[:24] for i, t in enumerate(sample_texts(sessions))]
+    plans = []
+    for text in targets:
+        at, keys = 0.0, []
+        for end in range(1, len(text) + 1):
+            at += rng.uniform(0.04, 0.22)
+            keys.append((at, text[:end]))
+        # browser side: a value goes out after budget seconds without a newer keystroke
+        sends = [(t + budget, q) for (t, q), nxt in zip(keys, keys[1:] + [(float("inf"), None)]) if nxt[0] - t > budget]
+        plans.append((keys[-1][0], sends))
+    latencies = []
+    lock = threading.Lock()
+
+    def work(q):
+        time.sleep(work_ms / 1000.0)  # stands in for encode + vector search
+        return q
+
+    def session(name, last_key, sends):
+        start = time.monotonic()
+        i = 0
+        while i < len(sends):
+            time.sleep(max(0.0, start + sends[i][0] - time.monotonic()))
+            # reruns queued behind a running one collapse into the newest value
+            now = time.monotonic() - start
+            while i + 1 < len(sends) and sends[i + 1][0] <= now:
+                i += 1
+            scheduler.run(name, sends[i][1], work)
+            i += 1
+        with lock:
+            latencies.append(time.monotonic() - start - last_key)
+
+    threads = [threading.Thread(target=session, args=(f"s{i}", *plan)) for i, plan in enumerate(plans)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    typed = sum(len(t) for t in targets)
+    stats = scheduler.stats()
+    print(f"budget={budget_ms:.0f}ms sessions={sessions} typed characters={typed} reruns sent={sum(len(s) for _, s in plans)}")
+    print(f"executed={stats['executed']} coalesced={stats['coalesced']}")
+    print(f"model+DB calls per typed character: 1.00 -> {stats['executed'] / typed:.2f}")
+    print(f"last keystroke -> final result: p50 {np.percentile(latencies, 50) * 1000:.0f}ms, "
+          f"max {max(latencies) * 1000:.0f}ms")
+
+# ----------------------------
+# vector_query result shape: bytes on the wire and BSON decode time
+# ----------------------------
+def bench_result_shape(dim: int, limit: int, repeats: int, live: bool):
+    import bson
+    import vector_codec
+
+    if live:
+        # needs the .env connection settings; main only connects on import
+        import main as cli
+        probe = np.random.default_rng(0).normal(size=dim).astype(np.float32)
+        probe = (probe / np.linalg.norm(probe)).tolist()
+        batches = {shape: cli.vector_query(probe, include_vectors=shape == "full") for shape in ("lean", "full")}
+    else:
+        # synthetic hits shaped like the real $project output; full = legacy list,
+        # float32 / int8 = packed by vector_codec (decode time includes unpacking)
+        rng = np.random.default_rng(0)
+        texts = sample_texts(limit)
+        batches = {}
+        for shape in ("lean", "full", "float32", "int8"):
+            docs = []
+            for i, text in enumerate(texts):
+                doc = {"id": f"{i:024x}", "text": text, "score": float(rng.random())}
+                if shape != "lean":
+                    value, codec = vector_codec.encode(rng.normal(size=dim), "list" if shape == "full" else shape)
+                    doc["embedding"] = value
+                    if codec:
+                        doc["codec"] = codec
+                docs.append(doc)
+            batches[shape] = docs
+
+    print(f"{'shape':>7} {'hits':>5} {'bytes':>9} {'decode ms':>10}")
+    for shape, docs in batches.items():
+        # a cursor batch reaches the driver as concatenated BSON documents
+        payload = b"".join(bson.encode(d) for d in docs)
+        unpack = shape in ("float32", "int8")
+        secs = _best_of(lambda: vector_codec.decode_hits(bson.decode_all(payload)) if unpack else bson.decode_all(payload), repeats)
+        print(f"{shape:>7} {len(docs):>5} {len(payload):>9} {secs * 1000:>10.3f}")
+
+# ----------------------------
+# process-pool embed stage scaling
+# ----------------------------
+def bench_pool(process_counts, n: int):
+    import embed_pool
+
+    texts = sample_texts(n)
+    print(f"physical cores={embedding_generator.physical_cores()} sentences={n}")
+    print(f"{'procs':>6} {'seconds':>9} {'sent/s':>9}")
+    for procs in process_counts:
+        with embed_pool.ProcessEmbedder(procs) as pool:
+            pool.embed(texts[:procs * pool.batch_size])  # warm up: every worker loads its model
+            chunks = [texts[i:i + pool.batch_size] for i in range(0, n, pool.batch_size)]
+            start = time.perf_counter()
+            # one feeding thread per process, as in bulk_insertion.run_pipeline
+            feeders = [threading.Thread(target=lambda part=chunks[i::procs]: [pool.embed(c) for c in part])
+                       for i in range(procs)]
+            for t in feeders:
+                t.start()
+            for t in feeders:
+                t.join()
+            secs = time.perf_counter() - start
+        print(f"{procs:>6} {secs:>9.3f} {n / secs:>9.1f}")
+
+# ----------------------------
+# lexical prefix index for short inputs
+# ----------------------------
+def bench_prefix(n: int, queries: int):
+    import prefix_index
+
+    texts = sample_texts(n)
+    start = time.perf_counter()
+    index = prefix_index.PrefixIndex(texts)
+    print(f"texts={n} words={len(index.words)} build={time.perf_counter() - start:.2f}s")
+    rng = random.Random(0)
+    print(f"{'chars':>6} {'p50 us':>9} {'p99 us':>9}")
+    for chars in (1, 2, 3, 5):
+        prefixes = [rng.choice(index.words)[:chars] for _ in range(queries)]
+        lat = []
+        for p in prefixes:
+            t = time.perf_counter()
+            index.query(p, 10)
+            lat.append(time.perf_counter() - t)
+        us = np.array(lat) * 1e6
+        print(f"{chars:>6} {np.percentile(us, 50):>9.1f} {np.percentile(us, 99):>9.1f}")
+
+# ----------------------------
+# retrieval quality: vector vs BM25 vs hybrid on the labelled Avengers set
+# ----------------------------
+def _ranking_metrics(hits, relevant, k: int):
+    texts = [h["text"] for h in hits[:k]]
+    gains = [1.0 if t in relevant else 0.0 for t in texts]
+    recall = sum(gains) / len(relevant)
+    rr = next((1.0 / (i + 1) for i, g in enumerate(gains) if g), 0.0)
+    dcg = sum(g / np.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sum(1.0 / np.log2(i + 2) for i in range(min(k, len(relevant))))
+    return recall, rr, dcg / ideal
+
+def bench_eval(k: int, search_ms: float):
+    import corpus
+    import lexical_index
+    import vector_index
+
+    texts = corpus.avengers_texts_large
+    ids = [str(i) for i in range(len(texts))]
+    index = vector_index.BruteForceIndex(embedding_generator.get_embeddings(texts), texts, ids)
+    bm25 = lexical_index.BM25Index(texts, ids)
+    labelled = corpus.eval_set(texts)
+
+    def vector_search(q):
+        vec = embedding_generator.get_embedding(q)
+        time.sleep(search_ms / 1000)  # stands in for the $vectorSearch round trip
+        return index.query(vec, lexical_index.FUSION_DEPTH), vec
+
+    systems = {
+        "vector": lambda q: vector_search(q)[0],
+        "bm25": lambda q: bm25.query(q, lexical_index.FUSION_DEPTH),
+        "hybrid": lambda q: lexical_index.hybrid_search(q, vector_search, bm25, k)[0],
+    }
+    print(f"queries={len(labelled)} corpus={len(texts)} k={k} simulated search={search_ms:.0f}ms")
+    print(f"{'system':>8} {'recall@k':>9} {'MRR':>7} {'nDCG@k':>8} {'ms/query':>9}")
+    for name, run in systems.items():
+        scores = []
+        start = time.perf_counter()
+        for query, relevant in labelled:
+            scores.append(_ranking_metrics(run(query), relevant, k))
+        ms = (time.perf_counter() - start) * 1000 / len(labelled)
+        recall, mrr, ndcg = np.mean(scores, axis=0)
+        print(f"{name:>8} {recall:>9.3f} {mrr:>7.3f} {ndcg:>8.3f} {ms:>9.2f}")
+
+# ----------------------------
+# suggest_service under concurrent load
+# ----------------------------
+def bench_service(url: str, endpoint: str, concurrency_levels, requests_per_level: int):
+    import asyncio
+    import aiohttp
+
+    # keystroke-like prefixes of real sentences, so the cache sees realistic reuse
+    texts = [t[:8 + i % 40] for i, t in enumerate(sample_texts(requests_per_level))]
+
+    async def one(session, text, latencies):
+        body = {"text": text} if endpoint == "suggest" else {"input": text}
+        start = time.perf_counter()
+        async with session.post(f"{url.rstrip('/')}/{endpoint}", json=body) as r:
+            r.raise_for_status()
+            await r.read()
+        latencies.append(time.perf_counter() - start)
+
+    async def level(concurrency):
+        latencies = []
+        sem = asyncio.Semaphore(concurrency)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+            async def guarded(text):
+                async with sem:
+                    await one(session, text, latencies)
+            await guarded(texts[0])  # warm connection
+            latencies.clear()
+            start = time.perf_counter()
+            await asyncio.gather(*(guarded(t) for t in texts))
+            secs = time.perf_counter() - start
+        ms = np.array(latencies) * 1000
+        return np.percentile(ms, 50), np.percentile(ms, 99), len(ms) / secs
+
+    print(f"endpoint=/{endpoint} requests per level={requests_per_level}")
+    print(f"{'conc':>5} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for c in concurrency_levels:
+        p50, p99, rps = asyncio.run(level(c))
+        print(f"{c:>5} {p50:>9.2f} {p99:>9.2f} {rps:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("encode", help="sentences/sec of the local model at several batch sizes")
+    p.add_argument("--device", default="auto", choices=embedding_generator.DEVICE_POLICIES)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64, 128])
+    p.add_argument("-n", type=int, default=512, help="number of sentences per run")
+    p.add_argument("--repeats", type=int, default=3)
+
+    p = sub.add_parser("onnx", help="ONNX parity check plus latency/throughput vs torch on CPU")
+    p.add_argument("-n", type=int, default=512, help="sentences for the throughput run")
+    p.add_argument("--queries", type=int, default=200, help="single-query latency samples")
+
+    p = sub.add_parser("scheduler", help="simulated typists: browser debounce, sequential reruns, cross-session coalescing")
+    p.add_argument("--budget-ms", type=float, default=150)
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--work-ms", type=float, default=30, help="simulated encode + search time")
+
+    p = sub.add_parser("result-shape", help="payload size / decode time of lean, full and packed vector_query results")
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--repeats", type=int, default=200)
+    p.add_argument("--live", action="store_true", help="query the configured collection via main.vector_query")
+
+    p = sub.add_parser("pool", help="embed throughput of the process pool at several process counts")
+    p.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("-n", type=int, default=2048)
+
+    p = sub.add_parser("prefix", help="build time and per-query latency of the short-input prefix index")
+    p.add_argument("-n", type=int, default=50000, help="texts to index")
+    p.add_argument("--queries", type=int, default=5000)
+
+    p = sub.add_parser("eval", help="recall/MRR/nDCG of vector, BM25 and hybrid retrieval on the labelled set")
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--search-ms", type=float, default=40, help="simulated vector search latency")
+
+    p = sub.add_parser("service", help="p50/p99 latency of a running suggest_service under concurrent load")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--endpoint", default="suggest", choices=("suggest", "embed"))
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    p.add_argument("-n", type=int, default=500, help="requests per concurrency level")
+
+    args = parser.parse_args()
+    if args.cmd == "encode":
+        bench_encode(args.device, args.batch_sizes, args.n, args.repeats)
+    elif args.cmd == "onnx":
+        bench_backends(args.n, args.queries)
+    elif args.cmd == "scheduler":
+        bench_scheduler(args.budget_ms, args.sessions, args.work_ms)
+    elif args.cmd == "result-shape":
+        bench_result_shape(args.dim, args.limit, args.repeats, args.live)
+    elif args.cmd == "pool":
+        bench_pool(args.processes, args.n)
+    elif args.cmd == "prefix":
+        bench_prefix(args.n, args.queries)
+    elif args.cmd == "eval":
+        bench_eval(args.k, args.search_ms)
+    elif args.cmd == "service":
+        bench_service(args.url, args.endpoint, args.concurrency, args.n)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import requests
 import sys
 import time
@@ -6,9 +7,17 @@ import threading
 from tqdm import tqdm
 import os, json
 import embedding_generator
+import embedding_store
+import atlas_search
+import bulk_writer
+import embed_pool
+import checkpoint
+import news_log
 from pymongo import MongoClient
 from dotenv import load_dotenv
 from pathlib import Path
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed # !!! only use if using bulk insertion and processing of vectors
 
 # ----------------------------
@@ -25,18 +34,27 @@ load_dotenv()  # loads variables from .env into os.environ
 URI_PROTOCOL = "mongodb+srv://"
 DB_NAME = "MLautoCompletionSystem"
 COLL_NAME = "embeddings-collection"
-VECTOR_INDEX = "default"     # must match your Atlas vector index name
 VECTOR_LIMIT = 5
 mongo_connection_url = os.getenv("mongo_connection_url")
 user_pass= os.getenv("user_pass")
 user_name=os.getenv("user_name")
 CONN_URL=f"{URI_PROTOCOL}{user_name}:{user_pass}{mongo_connection_url}"
-max_workers=25
 RATE_LIMIT = 0   # 500 ms
-embed_q = queue.Queue()
-store_q = queue.Queue()
 progress_bar = None
-_bulk_load_texts = None
+write_metrics = bulk_writer.WriteMetrics()
+
+# ----------------------------
+# streaming pipeline config: read -> batch -> embed -> write
+# ----------------------------
+# Stages are joined by bounded queues of batches, so memory stays flat on any
+# corpus size and the slowest stage throttles the reader through backpressure.
+EMBED_BATCH_SIZE = 64   # lines per queue item / forward pass
+EMBED_WORKERS = 1       # embed stage threads (they share one model instance)
+DB_WRITERS = 2          # batching writer threads (each one flushes whole batches)
+QUEUE_DEPTH = 8         # batches buffered between two stages before the upstream stage blocks
+# embed_processes in .env > 0 moves the embed stage into that many model
+# processes (embed_pool.py), one embed thread feeding each of them
+EMBED_PROCESSES = int(os.getenv("embed_processes", "0"))
 
 # ----------------------------
 # 3rd Party embedding api from huggingface space or local generation
@@ -59,113 +77,287 @@ def embed(text: str):
     # return r.json()["data"][0]["embedding"]
     return embedding_generator.get_embedding(text)
 
-# Embed Worker implementation to run under a thread instance ran below and do the embedding operation
-def embed_worker():
+# groups a stream of (text, marker) items into lists of `size` without reading ahead;
+# a None item (an idle live source) hands over the partial batch right away
+def batched(items, size: int):
+    batch = []
+    for item in items:
+        if item is None:
+            if batch:
+                yield batch
+                batch = []
+            continue
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Embed stage: one (seq, lines) batch in, one (seq, [(line, vector)]) batch out
+def embed_worker(embed_q, store_q, compute=None, model_id=None, tracker=None):
     while True:
-        line = embed_q.get()
-        if line is None:
+        item = embed_q.get()
+        if item is None:
             break
+        seq, lines = item
         try:
-            vec = embed(line)
-            store_q.put((line, vec))
+            # lines embedded by an earlier run come straight from the on-disk store
+            vecs = embedding_store.cached_embeddings(lines, model_id, compute)
+            store_q.put((seq, [(line, vec.tolist()) for line, vec in zip(lines, vecs)]))
 
             # progress tick (only from embed stage)
             if progress_bar:
-                progress_bar.update(1)
+                progress_bar.update(len(lines))
 
         except Exception as e:
             print("embed error:", e)
+            if tracker is not None and seq is not None:
+                # parked in the daemon; otherwise left uncommitted for a resumed run
+                tracker.give_up(seq, lines, f"embed error: {e}")
         finally:
             time.sleep(RATE_LIMIT)  # respect rate limit
-            embed_q.task_done() # marking the current item in queue done 
 
-# Embed database Worker implementation to run under a thread instance ran below and do the database insert operation (parrallely) under the multiple threads
-def db_worker():
+# Writer stage: each thread buffers (text, vector) pairs and flushes them with one
+# unordered bulk_write per batch (see bulk_writer.py), so a handful of connections
+# keep up with the embed stage
+def db_worker(store_q, tracker=None):
+    remaining = {}  # seq -> documents of that batch not settled yet
+    lost = {}       # seq -> texts that failed every retry
+
+    def settle(seq, n):
+        remaining[seq] -= n
+        if remaining[seq] == 0:
+            del remaining[seq]
+            texts = lost.pop(seq, None)
+            if tracker is None:
+                return
+            if texts:
+                tracker.give_up(seq, texts, "write failed after retries")
+            else:
+                tracker.commit(seq)
+
+    def committed(counts):
+        for seq, n in counts.items():
+            settle(seq, n)
+
+    def failed(items):
+        for seq, text in items:
+            if seq is not None:
+                lost.setdefault(seq, []).append(text)
+        for seq, n in Counter(seq for seq, _ in items if seq is not None).items():
+            settle(seq, n)
+
+    writer = bulk_writer.BatchWriter(coll, on_batch=write_metrics.record, on_commit=committed, on_failed=failed)
     while True:
-        item = store_q.get()
-        if item is None:
-            break
         try:
-            text, vec = item
-            # store_sentence(text, vec) # uncomment me to start storing
-            # optional logging:
-            # print(f"[DB] stored: {text[:40]}")
+            item = store_q.get(timeout=writer.time_left())
+        except queue.Empty:
+            item = (None, [])  # nothing new, the buffered batch hit its time threshold
+        try:
+            if item is None:
+                writer.flush()
+                break
+            seq, pairs = item
+            if seq is not None:
+                remaining[seq] = remaining.get(seq, 0) + len(pairs)
+            for text, vec in pairs:
+                writer.add(text, vec, seq)  # flushes by itself at the size threshold
+            if writer.due():
+                writer.flush()
         except Exception as e:
             print("db error:", e)
-        finally:
-            store_q.task_done()
-
-# create threads based on the producer/consumers queues
-def start_workers():
-    # one embed worker
-    threading.Thread(target=embed_worker, daemon=True).start()
-
-    # many db workers
-    for _ in range(max_workers):
-        threading.Thread(target=db_worker, daemon=True).start()
-
-# inserting file loaded data into input queue for embedding creation
-def ingest_newline_texts():
-    global _bulk_load_texts
 
+def run_pipeline(items, tracker=None, embed_workers: int = EMBED_WORKERS, db_writers: int = DB_WRITERS,
+                 queue_depth: int = QUEUE_DEPTH, batch_size: int = EMBED_BATCH_SIZE,
+                 embed_processes: int = EMBED_PROCESSES):
+    """
+    Stream (text, marker) `items` (typically a generator over a file)
+    through the embed and write stages and wait until everything is written.
+    With a checkpoint.CommitTracker, every batch's markers are saved once
+    the batch is written, so an interrupted run can resume.
+    """
+    embed_q = queue.Queue(maxsize=queue_depth)
+    store_q = queue.Queue(maxsize=queue_depth)
+
+    pool = None
+    compute = model_id = None
+    if embed_processes > 0:
+        pool = embed_pool.ProcessEmbedder(embed_processes, batch_size)
+        compute, model_id = pool.embed, pool.model_id
+        embed_workers = max(embed_workers, pool.processes)
+
+    embedders = [threading.Thread(target=embed_worker, args=(embed_q, store_q, compute, model_id, tracker), daemon=True)
+                 for _ in range(embed_workers)]
+    writers = [threading.Thread(target=db_worker, args=(store_q, tracker), daemon=True)
+               for _ in range(db_writers)]
+    for t in embedders + writers:
+        t.start()
+
+    # reader: put() blocks while the embed stage is behind
+    for batch in batched(items, batch_size):
+        seq = tracker.register([marker for _, marker in batch]) if tracker is not None else None
+        embed_q.put((seq, [text for text, _ in batch]))
+
+    # drain stage by stage: one stop marker per worker
+    for _ in embedders:
+        embed_q.put(None)
+    for t in embedders:
+        t.join()
+    for _ in writers:
+        store_q.put(None)
+    for t in writers:
+        t.join()
+    if pool is not None:
+        pool.close()
+
+# streams the newline-separated corpus as (line, byte offset just past it),
+# starting where the checkpoint says the last committed batch ended
+def ingest_newline_texts(file_path=None, ckpt=None):
     # Gets the script's own directory and appends the relative path
-    script_dir = Path(__file__).parent
-    file_path = script_dir / "raw_text" / "avengers.txt"
+    file_path = file_path or Path(__file__).parent / "raw_text" / "avengers.txt"
+    offset = ckpt.state.get("offset", 0) if ckpt else 0
 
     try:
-        # Open and read the local text file into a list
-        with open(file_path, "r", encoding="utf-8") as f:
-            _bulk_load_texts = [line.strip() for line in f if line.strip()]
-
-        for line in _bulk_load_texts:
-            embed_q.put(line)   # fast producer
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                offset += len(raw)
+                line = raw.decode("utf-8").strip()
+                if line:
+                    yield line, offset
 
     except FileNotFoundError:
         print(f"Error: The file was not found at {file_path}. "
               "Ensure you are running the script from the parent folder of 'raw_text'.")
 
-def ingest_json_and_mark_processed():
-    global _bulk_load_texts
-    
-    script_dir = Path(__file__).parent
-    file_path = script_dir / "raw_text" / "news_queue.json"    
-    if not file_path.exists():
-        print(f"File not found: {file_path}")
-        return
+# streams (description, log position) for news log records appended after
+# the consumer position saved in the checkpoint (see news_log.py)
+def ingest_json_and_mark_processed(log=None, ckpt=None):
+    log = log or news_log.open_log()   # imports a legacy news_queue.json on first use
+    position = ckpt.state.get("offset") if ckpt else None
+
+    queued = 0
+    for record, after in log.read_from(position):
+        description = (record.get("description") or "").strip()
+        # records without text still advance the position via the next yielded item
+        if description:
+            yield description, after
+            queued += 1
+
+    if queued:
+        print(f"Queued {queued} new descriptions.")
+    else:
+        print("No new unprocessed articles found.")
 
+# ----------------------------
+# daemon mode: fetch_news -> news log -> embed -> write, continuously
+# ----------------------------
+DAEMON_IDLE_SECONDS = 1.0      # how long the tail waits for new records before flushing a partial batch
+REPORT_SECONDS = 60
+# newsdata.io pubDate is wall time in fetch_news.TZ (asia/kolkata, no DST)
+PUBDATE_TZ = timezone(timedelta(hours=5, minutes=30))
+
+def published_ts(record):
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if not isinstance(data, dict):
-            print("Error: File content is not a JSON dictionary.")
-            return
-
-        new_items_found = False
-        
-        # 2. Iterate through each news object (the values)
-        for article_id, article_data in data.items():
-            # Check if processed is explicitly False (or missing)
-            if article_data.get("processed") is False:
-                description = article_data.get("description", "")
-                if description:
-                    # Put into your embedding queue for the MX350 threads
-                    embed_q.put(description.strip())
-                    # Mark as processed in our memory object
-                    article_data["processed"] = True
-                    new_items_found = True
-
-        # 3. Save the updated dictionary back to the file
-        if new_items_found: # uncomment me as well
-            # with open(file_path, "w", encoding="utf-8") as f:
-            #     json.dump(data, f, indent=4)
-            print("Successfully queued new descriptions and updated file to 'processed: true'.")
-        else:
-            print("No new unprocessed articles found.")
+        return datetime.strptime(record["pubDate"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=PUBDATE_TZ).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class FreshnessMetrics:
+    """
+    End-to-end lag per article: publish -> written and fetched -> written.
+    Atlas applies writes to the vector index within about a second, so
+    written is close to searchable.
+    """
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self.publish_lag = deque(maxlen=window)
+        self.fetch_lag = deque(maxlen=window)
+
+    def record(self, published, fetched, now=None):
+        now = now or time.time()
+        with self._lock:
+            if published is not None:
+                self.publish_lag.append(now - published)
+            if fetched is not None:
+                self.fetch_lag.append(now - fetched)
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return {}
+        ordered = sorted(values)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {"p50": round(pick(0.50), 1), "p95": round(pick(0.95), 1), "max": round(ordered[-1], 1)}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "articles": len(self.fetch_lag),
+                "publish_to_written_s": self._percentiles(self.publish_lag),
+                "fetch_to_written_s": self._percentiles(self.fetch_lag),
+            }
 
-    except json.JSONDecodeError:
-        print("Error: Could not decode JSON. Ensure the file is not empty or corrupted.")
-    except Exception as e:
-        print(f"Ingestion Error: {e}")
+freshness = FreshnessMetrics()
+
+def tail_news_log(log, position, stop, wakeup, idle: float = DAEMON_IDLE_SECONDS):
+    """
+    Follow the news log from `position` until stop is set, yielding
+    (description, (position_after, published_ts, fetched_at)) and a None
+    whenever the log is drained so the pipeline flushes what it holds.
+    """
+    while not stop.is_set():
+        wakeup.clear()  # before reading, so an append during the read is not missed
+        for record, after in log.read_from(position):
+            position = after
+            description = (record.get("description") or "").strip()
+            if description:
+                yield description, (after, published_ts(record), record.get("fetched_at"))
+        yield None
+        wakeup.wait(idle)
+
+def advance_position(state: dict, markers):
+    # daemon markers carry timestamps besides the log position
+    state["offset"] = markers[-1][0]
+
+def advance_and_measure(state: dict, markers):
+    advance_position(state, markers)
+    now = time.time()
+    for _, published, fetched in markers:
+        freshness.record(published, fetched, now)
+
+def run_daemon(stop: threading.Event = None, report_seconds: float = REPORT_SECONDS):
+    import fetch_news  # only the daemon talks to the news API
+
+    stop = stop or threading.Event()
+    wakeup = threading.Event()
+    bulk_writer.ensure_indexes(coll)
+    log = fetch_news.get_log()
+    ckpt = checkpoint.Checkpoint("news_log")
+    # a batch that keeps failing is parked instead of holding the checkpoint back for good;
+    # parked batches move the position but are not counted as fresh articles
+    tracker = checkpoint.CommitTracker(ckpt, advance_and_measure, checkpoint.DeadLetters("news_log"), advance_position)
+
+    poller = threading.Thread(target=fetch_news.run_polling, kwargs={"stop": stop, "on_added": lambda n: wakeup.set()},
+                              daemon=True)
+    source = tail_news_log(log, ckpt.state.get("offset"), stop, wakeup)
+    pipeline = threading.Thread(target=run_pipeline, args=(source, tracker), daemon=True)
+    poller.start()
+    pipeline.start()
+
+    try:
+        while pipeline.is_alive():
+            pipeline.join(report_seconds)
+            print(f"Freshness: {freshness.summary()}")
+            print(f"Writes: {write_metrics.summary()}, parked batches: {tracker.dead_letters.parked}")
+    except KeyboardInterrupt:
+        print("Stopping: draining in-flight batches...")
+        stop.set()
+        wakeup.set()
+        pipeline.join()
+    poller.join(timeout=5)
+    print(f"Freshness: {freshness.summary()}")
 
 # ----------------------------
 # Initilization of Database/Collection
@@ -180,37 +372,14 @@ coll = client[DB_NAME][COLL_NAME]
 # document field over which the index was created.
 
 def vector_query(vec):
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": "vector_index", #name of the created index here
-                "path": "embedding", #name of document field
-                "queryVector": vec,
-                "numCandidates": VECTOR_LIMIT * 20,
-                "limit": VECTOR_LIMIT
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "text": 1,
-                "embedding": 1,  # include the document field to be scanned
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        }
-    ]
-    # print(list(coll.aggregate(pipeline)))
-    return list(coll.aggregate(pipeline))
+    return atlas_search.query(coll, vec, VECTOR_LIMIT, include_vectors=True)
 
 # ----------------------------
 # storing embedding to atlas (for memory-building)
 # ----------------------------
 def store_sentence(text: str, emb):
-    coll.insert_one({
-        "text": text,
-        "embedding": emb,
-        "ts": time.time()
-    })
+    # same content-hash upsert as the bulk path, so re-storing is a no-op
+    return bulk_writer.store_one(coll, text, emb)
 
 # Non usable Sequential function
 # def bulk_process_threading(line):
@@ -229,29 +398,40 @@ def main():
 
     print("Starting the bulk insertion operation")
 
-    # total_items = len(_bulk_load_texts)
-    progress_bar = tqdm(total=168, desc="Embedding", ncols=100)
+    # streaming: the total is unknown up front
+    progress_bar = tqdm(desc="Embedding", unit=" lines", ncols=100)
 
     start_time = time.time()
+    bulk_writer.ensure_indexes(coll)
 
-    start_workers()
+    # uncomment source based on need; each source resumes from its own checkpoint
+    # ckpt = checkpoint.Checkpoint("avengers.txt")
+    # source = ingest_newline_texts(ckpt=ckpt)
+    # tracker = checkpoint.CommitTracker(ckpt, checkpoint.advance_offset)
+    ckpt = checkpoint.Checkpoint("news_log")
+    source = ingest_json_and_mark_processed(ckpt=ckpt)
+    tracker = checkpoint.CommitTracker(ckpt, checkpoint.advance_offset)
 
-    # uncomment function based on need
-    # ingest_newline_texts()
-    ingest_json_and_mark_processed()
-
-    # wait
-    embed_q.join()
-    store_q.join()
+    run_pipeline(source, tracker)
+    if tracker.pending():
+        print(f"{tracker.pending()} batches were not written; re-run to resume from the last checkpoint.")
 
     end_time = time.time()
     progress_bar.close()
 
     print(f"\nCompleted in {end_time - start_time:.2f} seconds.")
-  
+    print(f"Writes: {write_metrics.summary()}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed and store texts in the vector collection")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep polling the news API and ingest new articles as they arrive")
+    args = parser.parse_args()
     try:
-        main()
+        if args.daemon:
+            run_daemon()
+        else:
+            main()
     except KeyboardInterrupt:
         sys.exit(0)
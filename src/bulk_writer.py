@@ -0,0 +1,234 @@
+"""
+Batching writer stage for the embeddings collection.
+
+(text, vector) pairs are buffered and flushed with one unordered
+bulk_write once FLUSH_DOCS documents are waiting or the oldest one has
+waited FLUSH_SECONDS. Transient failures (network errors, elections) are
+retried with backoff, and only the failed part of a batch is resent.
+
+Writes are idempotent: every document's _id is the SHA-1 of its text and
+is written as an upsert that only sets fields on insert. A resent or
+replayed document matches the existing one and changes nothing, so a
+retry or a resumed ingest never duplicates documents.
+
+Every document also carries content_hash, the SHA-1 of its normalized text
+(case and whitespace folded, see embedding_cache.normalize_text). A unique
+index on it makes the server reject texts that differ only in formatting;
+those rejections are counted as duplicates, not failures.
+
+The embedding is packed by vector_codec (VECTOR_CODEC, float32 BSON binary
+by default) with its codec metadata next to it.
+"""
+import hashlib
+import time
+import threading
+from collections import Counter
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, ConnectionFailure, DuplicateKeyError, NetworkTimeout, OperationFailure
+
+import vector_codec
+from embedding_cache import normalize_text
+
+FLUSH_DOCS = 500
+FLUSH_SECONDS = 1.0
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+
+DUPLICATE_KEY = 11000
+# server write errors worth retrying (step-downs, shutdowns, network hiccups)
+TRANSIENT_CODES = {6, 7, 89, 91, 189, 9001, 10107, 11600, 11602, 13435, 13436}
+
+CONTENT_HASH_INDEX = "content_hash_unique"
+TS_INDEX = "ts_desc"   # newest-document lookups (vector_index snapshot fingerprint, near_dedup)
+
+def content_id(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+def make_doc(text: str, vec) -> dict:
+    embedding, codec = vector_codec.encode(vec)
+    doc = {
+        "_id": content_id(text),
+        "text": text,
+        "content_hash": content_hash(text),
+        "embedding": embedding,
+        "ts": time.time()
+    }
+    if codec:
+        doc["codec"] = codec
+    return doc
+
+def upsert_spec(doc: dict):
+    # (filter, update) of the insert-once upsert every write path uses
+    fields = {k: v for k, v in doc.items() if k != "_id"}
+    return {"_id": doc["_id"]}, {"$setOnInsert": fields}
+
+def upsert_op(doc: dict) -> UpdateOne:
+    return UpdateOne(*upsert_spec(doc), upsert=True)
+
+def store_one(coll, text: str, vec) -> bool:
+    # single-document path for interactive inserts; False if the text was already stored
+    try:
+        result = coll.update_one(*upsert_spec(make_doc(text, vec)), upsert=True)
+    except DuplicateKeyError:
+        return False  # same normalized text stored under another _id
+    return result.upserted_id is not None
+
+async def store_one_async(coll, text: str, vec) -> bool:
+    # store_one for a motor collection
+    try:
+        result = await coll.update_one(*upsert_spec(make_doc(text, vec)), upsert=True)
+    except DuplicateKeyError:
+        return False
+    return result.upserted_id is not None
+
+def ensure_ts_index(coll) -> bool:
+    # readers need it too (vector_index fingerprints a collection at start); a no-op once it exists
+    try:
+        coll.create_index([("ts", DESCENDING)], name=TS_INDEX)
+        return True
+    except OperationFailure as e:
+        print(f"Could not create the ts index ({e}); newest-document lookups will scan the collection.")
+        return False
+
+def ensure_indexes(coll) -> bool:
+    """
+    Create the ts index and the unique content_hash index. Documents without
+    content_hash (not backfilled yet) are left out of the latter, which fails
+    while duplicates exist; run deduplicator.py --backfill first.
+    """
+    ensure_ts_index(coll)
+    try:
+        coll.create_index(
+            [("content_hash", ASCENDING)],
+            name=CONTENT_HASH_INDEX,
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}},
+        )
+        return True
+    except OperationFailure as e:
+        print(f"Could not create unique content_hash index ({e}); run deduplicator.py --backfill first.")
+        return False
+
+class BatchWriter:
+    def __init__(self, coll, flush_docs: int = FLUSH_DOCS, flush_seconds: float = FLUSH_SECONDS,
+                 max_retries: int = MAX_RETRIES, on_batch=None, on_commit=None, on_failed=None):
+        self.coll = coll
+        self.flush_docs = flush_docs
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.on_batch = on_batch     # called with the metrics dict of every flushed batch
+        self.on_commit = on_commit   # called with Counter(tag -> docs) written (or already present) per flush
+        self.on_failed = on_failed   # called with [(tag, text)] still failing after the retries
+        self._ops = []
+        self._tags = []
+        self._texts = []
+        self._oldest = None
+
+    def __len__(self):
+        return len(self._ops)
+
+    def add(self, text: str, vec, tag=None):
+        if not self._ops:
+            self._oldest = time.monotonic()
+        self._ops.append(upsert_op(make_doc(text, vec)))
+        self._tags.append(tag)
+        self._texts.append(text)
+        if len(self._ops) >= self.flush_docs:
+            return self.flush()
+        return None
+
+    def due(self) -> bool:
+        return bool(self._ops) and time.monotonic() - self._oldest >= self.flush_seconds
+
+    def time_left(self) -> float:
+        # seconds until the buffered batch must be flushed (None when empty)
+        if not self._ops:
+            return None
+        return max(0.0, self.flush_seconds - (time.monotonic() - self._oldest))
+
+    def flush(self):
+        if not self._ops:
+            return None
+        ops, self._ops = self._ops, []
+        tags, self._tags = self._tags, []
+        texts, self._texts = self._texts, []
+        start = time.monotonic()
+        metrics = {"docs": len(ops), "written": 0, "duplicates": 0, "failed": 0, "retries": 0}
+
+        pending = list(range(len(ops)))   # positions in ops still to be written
+        failed = []
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self.coll.bulk_write([ops[i] for i in pending], ordered=False)
+                metrics["written"] += result.upserted_count
+                metrics["duplicates"] += result.matched_count
+                pending = []
+                break
+            except BulkWriteError as e:
+                # unordered: everything without a write error went through
+                details = e.details
+                metrics["written"] += details.get("nUpserted", 0)
+                metrics["duplicates"] += details.get("nMatched", 0)
+                retry = []
+                for err in details.get("writeErrors", []):
+                    i = pending[err["index"]]
+                    if err["code"] == DUPLICATE_KEY:
+                        # two upserts of the same text raced, the other one won
+                        metrics["duplicates"] += 1
+                    elif err["code"] in TRANSIENT_CODES:
+                        retry.append(i)
+                    else:
+                        failed.append(i)
+                        print(f"db write error: {err.get('errmsg')}")
+                pending = retry
+            except (AutoReconnect, NetworkTimeout, ConnectionFailure) as e:
+                print(f"db transient error (attempt {attempt + 1}): {e}")
+            if not pending:
+                break
+            if attempt < self.max_retries:
+                metrics["retries"] += 1
+                time.sleep(RETRY_BASE_DELAY * (2 ** attempt))
+
+        failed.extend(pending)
+        metrics["failed"] = len(failed)
+        metrics["seconds"] = time.monotonic() - start
+        metrics["docs_per_sec"] = metrics["docs"] / metrics["seconds"] if metrics["seconds"] else 0.0
+        if self.on_batch:
+            self.on_batch(metrics)
+        lost = set(failed)
+        if self.on_commit:
+            self.on_commit(Counter(t for i, t in enumerate(tags) if t is not None and i not in lost))
+        if self.on_failed and failed:
+            self.on_failed([(tags[i], texts[i]) for i in failed])
+        return metrics
+
+# ----------------------------
+# aggregate metrics across writer threads
+# ----------------------------
+class WriteMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = []
+
+    def record(self, metrics: dict):
+        with self._lock:
+            self.batches.append(metrics)
+
+    def summary(self) -> dict:
+        with self._lock:
+            batches = list(self.batches)
+        docs = sum(b["docs"] for b in batches)
+        seconds = sum(b["seconds"] for b in batches)
+        return {
+            "batches": len(batches),
+            "docs": docs,
+            "written": sum(b["written"] for b in batches),
+            "duplicates": sum(b["duplicates"] for b in batches),
+            "failed": sum(b["failed"] for b in batches),
+            "retries": sum(b["retries"] for b in batches),
+            "avg_batch_ms": 1000 * seconds / len(batches) if batches else 0.0,
+        }
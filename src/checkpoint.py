@@ -0,0 +1,125 @@
+"""
+Durable ingest checkpoints, one small JSON file per input source.
+
+The reader registers every batch it hands to the pipeline together with
+its position markers (byte offset for newline files, [segment, offset]
+consumer position for the news log). Writers report a batch as committed
+once all of its documents are in MongoDB, and CommitTracker only moves the checkpoint
+across a contiguous run of committed batches. A restarted run therefore
+resumes right after the last batch that is known to be written; anything
+after it is replayed, and the content-hash _id upserts in bulk_writer
+make that replay a no-op on the collection.
+
+A long-running consumer cannot wait for a restart to replay a batch that
+keeps failing: with a DeadLetters file the tracker parks such a batch
+there and counts it as committed, so the checkpoint keeps moving.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+CHECKPOINT_DIR = Path(__file__).parent / "cache" / "checkpoints"
+
+def atomic_write_json(path: Path, data):
+    # write-then-rename so a crash leaves either the old or the new file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class Checkpoint:
+    def __init__(self, source: str, root: Path = CHECKPOINT_DIR):
+        self.path = Path(root) / f"{source}.json"
+        self.state = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self):
+        atomic_write_json(self.path, self.state)
+
+    def reset(self):
+        self.state = {}
+        if self.path.exists():
+            self.path.unlink()
+
+# how a committed batch's markers fold into the saved state
+def advance_offset(state: dict, markers):
+    # markers are read positions just past each item, in read order
+    state["offset"] = markers[-1]
+
+class DeadLetters:
+    """Batches given up on, one JSON line each under cache/checkpoints/<source>.dead.jsonl."""
+    def __init__(self, source: str, root: Path = CHECKPOINT_DIR):
+        self.path = Path(root) / f"{source}.dead.jsonl"
+        self._lock = threading.Lock()
+        self.parked = 0
+
+    def park(self, texts, markers, reason: str):
+        line = json.dumps({"ts": time.time(), "reason": reason, "markers": markers, "texts": list(texts)})
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.parked += 1
+        print(f"Parked {len(texts)} texts in {self.path} ({reason})")
+
+class CommitTracker:
+    def __init__(self, checkpoint: Checkpoint, apply, dead_letters: DeadLetters = None, skip=None):
+        self.checkpoint = checkpoint
+        self.apply = apply
+        # without dead_letters a failed batch stays pending and the next run replays it
+        self.dead_letters = dead_letters
+        self.skip = skip or apply   # folds a parked batch's markers into the state
+        self._lock = threading.Lock()
+        self._markers = {}      # seq -> markers of a batch still in flight
+        self._parked = set()    # seqs committed through the dead-letter file
+        self._done = set()      # committed seqs beyond the contiguous prefix
+        self._next_seq = 0      # seq handed to the next registered batch
+        self._watermark = 0     # every seq below this is committed and saved
+
+    def register(self, markers) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._markers[seq] = list(markers)
+            return seq
+
+    def commit(self, seq: int):
+        with self._lock:
+            self._done.add(seq)
+            advanced = False
+            while self._watermark in self._done:
+                self._done.discard(self._watermark)
+                markers = self._markers.pop(self._watermark)
+                if markers:
+                    fold = self.skip if self._watermark in self._parked else self.apply
+                    fold(self.checkpoint.state, markers)
+                self._parked.discard(self._watermark)
+                self._watermark += 1
+                advanced = True
+            if advanced:
+                self.checkpoint.save()
+
+    def give_up(self, seq: int, texts, reason: str):
+        """A batch that could not be embedded or written: park it, or leave it pending."""
+        if self.dead_letters is None:
+            print(f"Batch {seq} failed ({reason}); the checkpoint stops before it until a re-run")
+            return
+        with self._lock:
+            markers = self._markers.get(seq, [])
+            self._parked.add(seq)
+        self.dead_letters.park(texts, markers, reason)
+        self.commit(seq)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._markers)
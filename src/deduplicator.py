@@ -1,9 +1,15 @@
-from pymongo import MongoClient
+
+import argparse
+from pymongo import MongoClient, UpdateOne
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from itertools import islice
 import os
+import time
 from dotenv import load_dotenv
 
-load_dotenv() 
+import bulk_writer
+
+load_dotenv()
 
 URI_PROTOCOL = "mongodb+srv://"
 mongo_connection_url = os.getenv("mongo_connection_url")
@@ -12,11 +18,13 @@ user_name=os.getenv("user_name")
 MONGO_URI   = f"{URI_PROTOCOL}{user_name}:{user_pass}{mongo_connection_url}"
 DB_NAME     = "MLautoCompletionSystem"
 COLL_NAME   = "embeddings-collection"
-DEDUP_FIELD = "text"     # field that must be unique
+DEDUP_FIELD = "content_hash"     # field that must be unique (sha1 of normalized text)
 BATCH_SIZE  = 5000               # safe delete batch size
+CURSOR_BATCH = 1000              # documents per cursor round trip
 
-client = MongoClient(MONGO_URI)
-coll   = client[DB_NAME][COLL_NAME]
+def get_collection():
+    client = MongoClient(MONGO_URI)
+    return client[DB_NAME][COLL_NAME]
 
 def batch(iterable, size):
     it = iter(iterable)
@@ -26,27 +34,145 @@ def batch(iterable, size):
             return
         yield chunk
 
-print("Scanning for duplicates...")
-
-cursor = coll.aggregate([
-    {"$group": {
-        "_id": f"${DEDUP_FIELD}",
-        "ids": {"$push": "$_id"},
-        "count": {"$sum": 1}
-    }},
-    {"$match": {"count": {"$gt": 1}}}
-])
-
-# print(f"Duplicate Entries: {list(cursor)}")
-total_deleted = 0
-
-for group in cursor:
-    # keep first, delete the rest
-    dup_ids = group["ids"][1:]
-    print(f"Duplicate ids: {dup_ids}")
-    for chunk in batch(dup_ids, BATCH_SIZE):
-        print(f"Deleting the Entry: {chunk}")
-        result = coll.delete_many({"_id": {"$in": chunk}})
-        total_deleted += result.deleted_count
-
-print(f"Done. Deleted {total_deleted} duplicate documents.")
\ No newline at end of file
+# ----------------------------
+# backfill: content_hash for documents written before it existed
+# ----------------------------
+def backfill_hashes(coll, batch_size: int = BATCH_SIZE) -> int:
+    """Stream documents without content_hash and set it in bulk batches."""
+    cursor = coll.find({DEDUP_FIELD: {"$exists": False}}, {"text": 1}).batch_size(CURSOR_BATCH)
+    updated = 0
+    for chunk in batch(cursor, batch_size):
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": {DEDUP_FIELD: bulk_writer.content_hash(doc.get("text") or "")}})
+               for doc in chunk]
+        updated += coll.bulk_write(ops, ordered=False).modified_count
+        print(f"Backfilled {updated} hashes...")
+    return updated
+
+# ----------------------------
+# dedupe: keep the oldest document per content_hash
+# ----------------------------
+DELETE_WORKERS = 4      # parallel delete_many calls in flight
+REPORT_EVERY = 5.0      # seconds between progress lines
+
+def duplicate_ids(coll):
+    """
+    Stream {_id, content_hash} of every document to delete: all but the
+    oldest (by ts) of each content_hash. A window rank instead of a $group
+    with $push means no per-group id arrays; allowDiskUse lets the
+    partition sort spill to disk instead of hitting the 100MB stage limit.
+    """
+    return coll.aggregate(
+        [
+            {"$match": {DEDUP_FIELD: {"$exists": True}}},
+            {"$setWindowFields": {
+                "partitionBy": f"${DEDUP_FIELD}",
+                "sortBy": {"ts": 1},
+                "output": {"rank": {"$documentNumber": {}}}
+            }},
+            {"$match": {"rank": {"$gt": 1}}},
+            {"$project": {"_id": 1, DEDUP_FIELD: 1}}
+        ],
+        allowDiskUse=True,
+        batchSize=CURSOR_BATCH,
+    )
+
+class Progress:
+    def __init__(self, label: str, every: float = REPORT_EVERY):
+        self.label = label
+        self.every = every
+        self.start = self.last = time.monotonic()
+        self.count = 0
+
+    def add(self, n: int):
+        self.count += n
+        now = time.monotonic()
+        if now - self.last >= self.every:
+            self.last = now
+            self.report()
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.count / elapsed if elapsed else 0.0
+
+    def report(self):
+        print(f"{self.label}: {self.count} in {time.monotonic() - self.start:.1f}s ({self.rate():.0f}/s)")
+
+def dedupe(coll, dry_run: bool = False, batch_size: int = BATCH_SIZE, workers: int = DELETE_WORKERS,
+           sample: int = 10) -> dict:
+    """
+    Delete exact duplicates. Ids are accumulated across groups into
+    `batch_size` $in batches and deleted by up to `workers` parallel
+    delete_many calls; at most 2 * workers batches are queued, so memory
+    and cluster load stay bounded. dry_run only counts and samples.
+    """
+    found = Progress("Duplicates found")
+    deleted = Progress("Deleted")
+    groups, last_hash = 0, None   # window output arrives partitioned, one hash after another
+    samples = []
+
+    def delete(chunk):
+        return coll.delete_many({"_id": {"$in": chunk}}).deleted_count
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for chunk in batch(duplicate_ids(coll), batch_size):
+            found.add(len(chunk))
+            for d in chunk:
+                if d[DEDUP_FIELD] != last_hash:
+                    groups, last_hash = groups + 1, d[DEDUP_FIELD]
+            if len(samples) < sample:
+                samples.extend(chunk[:sample - len(samples)])
+            if dry_run:
+                continue
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for job in done:
+                    deleted.add(job.result())
+            in_flight.add(pool.submit(delete, [d["_id"] for d in chunk]))
+        for job in in_flight:
+            deleted.add(job.result())
+
+    return {
+        "duplicates": found.count,
+        "groups": groups,
+        "deleted": deleted.count,
+        "seconds": round(time.monotonic() - found.start, 1),
+        "deleted_per_sec": round(deleted.rate()),
+        "sample": samples,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate texts from the embeddings collection")
+    parser.add_argument("--backfill", action="store_true",
+                        help="one-off migration: hash old documents, dedupe, then create the unique index")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted, delete nothing")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="ids per delete_many $in batch")
+    parser.add_argument("--workers", type=int, default=DELETE_WORKERS, help="parallel delete workers")
+    args = parser.parse_args()
+
+    coll = get_collection()
+
+    if args.backfill:
+        if args.dry_run:
+            print(f"{coll.count_documents({DEDUP_FIELD: {'$exists': False}})} documents have no content hash yet "
+                  "(dry run: not backfilled, so they are not checked below).")
+        else:
+            print("Backfilling content hashes...")
+            print(f"Backfilled {backfill_hashes(coll)} documents.")
+
+    print("Scanning for duplicates..." + (" (dry run)" if args.dry_run else ""))
+    stats = dedupe(coll, dry_run=args.dry_run, batch_size=args.batch_size, workers=args.workers)
+    for doc in stats.pop("sample"):
+        print(f"  duplicate {doc['_id']} (content_hash {doc[DEDUP_FIELD]})")
+    if args.dry_run:
+        print(f"Dry run: {stats['duplicates']} duplicates in {stats['groups']} groups would be deleted "
+              f"(scan took {stats['seconds']}s).")
+        return
+    print(f"Done. Deleted {stats['deleted']} of {stats['duplicates']} duplicates in {stats['groups']} groups "
+          f"in {stats['seconds']}s ({stats['deleted_per_sec']}/s).")
+
+    if args.backfill and bulk_writer.ensure_indexes(coll):
+        print("Unique content_hash index is in place; duplicates are now rejected at write time.")
+
+if __name__ == "__main__":
+    main()
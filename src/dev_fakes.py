@@ -0,0 +1,329 @@
+"""
+Local stand-ins for external services, for trying things out offline.
+
+FakeNewsServer speaks enough of the newsdata.io /latest API for
+fetch_news: paged results with a nextPage cursor, plus scripted failures
+(HTTP 429 with Retry-After, 5xx). Point fetch_news at it with
+
+    with FakeNewsServer(articles) as server:
+        fetch_news.NEWS_API_URL = server.url
+        ...
+
+or set news_api_url in the environment before starting fetch_news.
+
+FakeEmbedServer answers the OpenAI-style /v1/embeddings call main.py
+makes, with deterministic hash-seeded vectors. FakeAsyncCollection is an
+in-memory stand-in for a motor collection that supports the
+$vectorSearch + $project pipeline and upserts. Together they run the
+async recommender with no network:
+
+    with FakeEmbedServer() as server:
+        asyncio.run(main.async_main(server.url, FakeAsyncCollection()))
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import vector_codec
+
+def make_articles(n: int, start: int = 0, prefix: str = "fake"):
+    # newest first, like the real API
+    return [
+        {
+            "article_id": f"{prefix}-{i}",
+            "title": f"Headline {i}",
+            "description": f"Description of article {i}",
+            "link": f"https://example.invalid/{prefix}/{i}",
+            "pubDate": "2025-01-01 00:00:00",
+        }
+        for i in range(start + n - 1, start - 1, -1)
+    ]
+
+class _JsonHTTPServer:
+    """Threaded local HTTP server; subclasses answer in route(method, path, query, body)."""
+    path = "/"
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.requests = []   # (method, query or body) of every request served
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def route(self, method: str, path: str, query: dict, body):
+        raise NotImplementedError
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, like the real services
+
+            def _serve(self, method):
+                url = urlparse(self.path)
+                if url.path != fake.path:
+                    self.send_error(404)
+                    return
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, headers, reply = fake.route(method, url.path, query, body)
+                payload = json.dumps(reply).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client went away (e.g. a cancelled request)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class FakeNewsServer(_JsonHTTPServer):
+    """
+    Serves `articles` page_size at a time on /api/1/latest.
+
+    failures is a list of (status, retry_after) consumed one per request
+    before normal responses resume, e.g. [(429, "2"), (503, None)].
+    reply_next(payload) serves a raw 200 body once (malformed payloads).
+    """
+    path = "/api/1/latest"
+
+    def __init__(self, articles=None, page_size: int = 10, failures=None, host: str = "127.0.0.1"):
+        super().__init__(host)
+        self.articles = list(articles or [])
+        self.page_size = page_size
+        self.failures = list(failures or [])
+        self.replies = []
+
+    def publish(self, articles):
+        # new articles go on top, as they would on the live feed
+        with self._lock:
+            self.articles[:0] = articles
+
+    def fail_next(self, status: int, retry_after=None):
+        with self._lock:
+            self.failures.append((status, retry_after))
+
+    def reply_next(self, payload):
+        with self._lock:
+            self.replies.append(payload)
+
+    def route(self, method, path, query, body):
+        with self._lock:
+            self.requests.append(query)
+            if self.failures:
+                status, retry_after = self.failures.pop(0)
+                reply = {"status": "error", "results": {"message": "scripted failure", "code": str(status)}}
+                headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+                return status, headers, reply
+            if self.replies:
+                return 200, {}, self.replies.pop(0)
+
+            start = int(query.get("page", "0") or 0)
+            results = self.articles[start:start + self.page_size]
+            nxt = start + self.page_size
+            reply = {
+                "status": "success",
+                "totalResults": len(self.articles),
+                "results": results,
+                "nextPage": str(nxt) if nxt < len(self.articles) else None,
+            }
+            return 200, {}, reply
+
+# ----------------------------
+# embedding endpoint and vector store stand-ins
+# ----------------------------
+def fake_vector(text: str, dim: int = 1024):
+    # deterministic unit vector per text; equal texts give equal vectors
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+class FakeEmbedServer(_JsonHTTPServer):
+    """
+    OpenAI-style POST /v1/embeddings: {"input": str | [str]} ->
+    {"data": [{"embedding": [...], "index": i}]}. `delay` seconds per
+    request makes cancellation and overlap observable.
+    """
+    path = "/v1/embeddings"
+
+    def __init__(self, dim: int = 1024, delay: float = 0.0, host: str = "127.0.0.1"):
+        super().__init__(host)
+        self.dim = dim
+        self.delay = delay
+
+    def route(self, method, path, query, body):
+        if method != "POST" or not body or "input" not in body:
+            return 400, {}, {"error": "expected POST with an input field"}
+        with self._lock:
+            self.requests.append(body)
+        if self.delay:
+            time.sleep(self.delay)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = [{"object": "embedding", "index": i, "embedding": fake_vector(t, self.dim)} for i, t in enumerate(inputs)]
+        return 200, {}, {"object": "list", "model": body.get("model"), "data": data}
+
+class _FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    async def to_list(self, length=None):
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield doc
+
+class _UpdateResult:
+    def __init__(self, upserted_id=None, matched_count=0):
+        self.upserted_id = upserted_id
+        self.matched_count = matched_count
+
+class FakeAsyncCollection:
+    """
+    In-memory motor collection: documents live in a dict by _id.
+    Supports update_one with $setOnInsert/$set (+ upsert), find_one by _id,
+    and aggregate with $vectorSearch (exact cosine, Atlas score
+    convention) followed by a simple $project. `latency` seconds are
+    awaited per call to mimic a network round trip.
+    """
+    def __init__(self, docs=None, latency: float = 0.0):
+        self.docs = {d["_id"]: dict(d) for d in (docs or [])}
+        self.latency = latency
+        self.calls = []
+
+    async def _round_trip(self, name):
+        self.calls.append(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def find_one(self, query):
+        await self._round_trip("find_one")
+        doc = self.docs.get(query.get("_id"))
+        return dict(doc) if doc else None
+
+    async def update_one(self, query, update, upsert=False):
+        await self._round_trip("update_one")
+        _id = query["_id"]
+        if _id in self.docs:
+            self.docs[_id].update(update.get("$set", {}))
+            return _UpdateResult(matched_count=1)
+        if not upsert:
+            return _UpdateResult()
+        self.docs[_id] = {"_id": _id, **update.get("$setOnInsert", {}), **update.get("$set", {})}
+        return _UpdateResult(upserted_id=_id)
+
+    def aggregate(self, pipeline):
+        search = pipeline[0].get("$vectorSearch")
+        if search is None:
+            raise NotImplementedError("FakeAsyncCollection only runs $vectorSearch pipelines")
+        return _FakeAggregate(self, search, pipeline[1:])
+
+    def _search(self, search, stages):
+        path = search["path"]
+        docs = [d for d in self.docs.values() if d.get(path) is not None]
+        if not docs:
+            return []
+        mat = vector_codec.decode_many(docs, path)
+        q = np.asarray(search["queryVector"], dtype=np.float32)
+        cos = (mat @ q) / (np.linalg.norm(mat, axis=1) * np.linalg.norm(q) + 1e-12)
+        order = np.argsort(-cos)[:search["limit"]]
+        hits = []
+        for i in order:
+            doc = dict(docs[i])
+            doc["_score"] = float((1 + cos[i]) / 2)
+            hits.append(doc)
+        for stage in stages:
+            if "$project" in stage:
+                hits = [_project(doc, stage["$project"]) for doc in hits]
+            elif "$limit" in stage:
+                hits = hits[:stage["$limit"]]
+        return hits
+
+class _FakeAggregate(_FakeCursor):
+    def __init__(self, coll, search, stages):
+        super().__init__(None)
+        self._coll = coll
+        self._search_args = (search, stages)
+
+    async def _run(self):
+        if self._docs is None:
+            await self._coll._round_trip("aggregate")
+            self._docs = self._coll._search(*self._search_args)
+        return self._docs
+
+    async def to_list(self, length=None):
+        await self._run()
+        return await super().to_list(length)
+
+    async def _iter(self):
+        for doc in await self._run():
+            yield doc
+
+def _project(doc, spec):
+    out = {}
+    for key, rule in spec.items():
+        if rule == 0:
+            continue
+        if rule == 1:
+            if key in doc:
+                out[key] = doc[key]
+        elif rule == {"$meta": "vectorSearchScore"}:
+            out[key] = doc["_score"]
+        elif isinstance(rule, dict) and "$toString" in rule:
+            out[key] = str(doc[rule["$toString"].lstrip("$")])
+    if spec.get("_id", 1) != 0:
+        out["_id"] = doc["_id"]
+    return out
+
+if __name__ == "__main__":
+    # standalone fakes: python dev_fakes.py, then news_api_url=<printed url>
+    with FakeNewsServer(make_articles(50), page_size=10) as news, FakeEmbedServer() as embed:
+        print(f"Fake news API at {news.url}")
+        print(f"Fake embed API at {embed.url}  (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
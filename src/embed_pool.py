@@ -0,0 +1,129 @@
+"""
+Multi-process embedding stage for CPU-bound ingest.
+
+A single in-process model is limited by the GIL and one forward pass at a
+time. ProcessEmbedder starts a pool of worker processes that each load
+./models/bge-small once, pinned to their own slice of cores with a matching
+torch thread count so the pool does not oversubscribe the machine.
+
+Vectors come back through shared memory instead of pickled lists: the
+parent owns a ring of slots (slots x batch x dim float32), hands a worker
+a free slot with each batch, and the worker writes its rows straight into
+it and returns only the row count.
+"""
+import json
+import multiprocessing as mp
+import os
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import embedding_generator
+
+POOL_BATCH_SIZE = 64
+
+# ----------------------------
+# worker process side
+# ----------------------------
+_shm = None
+_slots = None
+
+def _init_worker(counter, num_workers, shm_name, shape):
+    global _shm, _slots
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    threads = embedding_generator.pin_worker(index, num_workers)
+    os.environ["embedding_threads"] = str(threads)  # keep load_model on this worker's slice
+    embedding_generator._model = embedding_generator.load_model("cpu", "torch")
+
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _slots = np.ndarray(shape, dtype=np.float32, buffer=_shm.buf)
+
+def _encode_into(slot: int, texts):
+    vecs = embedding_generator.get_embeddings(texts, batch_size=len(texts))
+    _slots[slot, :len(texts)] = vecs
+    return len(texts)
+
+# ----------------------------
+# parent side
+# ----------------------------
+def _model_dim() -> int:
+    # read from the model config so the parent never loads the model itself
+    with open(os.path.join(embedding_generator.DISK_PATH, "config.json")) as f:
+        return json.load(f)["hidden_size"]
+
+class ProcessEmbedder:
+    def __init__(self, processes: int = None, batch_size: int = POOL_BATCH_SIZE, slots: int = None):
+        self.processes = processes or embedding_generator.physical_cores()
+        self.model_id = embedding_generator.model_id("torch")   # workers always run the torch model
+        self.batch_size = batch_size
+        slots = slots or 2 * self.processes
+        self.dim = _model_dim()
+
+        shape = (slots, batch_size, self.dim)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        self._slots = np.ndarray(shape, dtype=np.float32, buffer=self._shm.buf)
+        self._free = queue.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+        # spawn: forking a process that already initialised torch is not safe
+        ctx = mp.get_context("spawn")
+        self._pool = ProcessPoolExecutor(
+            self.processes,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(ctx.Value("i", 0), self.processes, self._shm.name, shape),
+        )
+
+    def embed(self, texts):
+        """Float32 (len(texts), dim) matrix, computed across the pool."""
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        pending = deque()   # (slot, first row, job) in submission order
+
+        def collect():
+            slot, row, job = pending.popleft()
+            try:
+                n = job.result()
+                out[row:row + n] = self._slots[slot, :n]
+            finally:
+                self._free.put(slot)   # the worker is done with it either way
+
+        try:
+            for row in range(0, len(texts), self.batch_size):
+                # more chunks than slots: copy out our oldest job to free its slot
+                while True:
+                    try:
+                        slot = self._free.get_nowait()
+                        break
+                    except queue.Empty:
+                        if not pending:
+                            slot = self._free.get()  # other callers hold every slot
+                            break
+                        collect()
+                pending.append((slot, row, self._pool.submit(_encode_into, slot, texts[row:row + self.batch_size])))
+            while pending:
+                collect()
+            return out
+        finally:
+            # a slot is only reusable once its worker stopped writing into it
+            wait([job for _, _, job in pending])
+            for slot, _, _ in pending:
+                self._free.put(slot)
+
+    def close(self):
+        self._pool.shutdown()
+        self._slots = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
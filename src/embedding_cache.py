@@ -0,0 +1,101 @@
+"""
+In-process LRU/TTL cache for query embeddings.
+
+Every keystroke in the Streamlit box re-embeds the whole query, and typing
+patterns (backspace, retype) revisit the same strings within seconds.
+Vectors are kept as float32 NumPy arrays keyed by normalized text, bounded
+by both an entry count and a byte budget.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_WS = re.compile(r"\s+")
+
+def normalize_text(text: str, casefold: bool = True, collapse_whitespace: bool = True) -> str:
+    # bge-small uses an uncased tokenizer, so case folding does not change the vector
+    text = text.strip()
+    if collapse_whitespace:
+        text = _WS.sub(" ", text)
+    if casefold:
+        text = text.casefold()
+    return text
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = None, casefold: bool = True, collapse_whitespace: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.casefold = casefold
+        self.collapse_whitespace = collapse_whitespace
+        self._data = OrderedDict()   # key -> (vector, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return normalize_text(text, self.casefold, self.collapse_whitespace)
+
+    def get(self, text: str):
+        key = self.key(text)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, vec):
+        # always an own copy: a row view would keep the caller's whole batch matrix alive
+        # behind the byte budget, and the caller could still write into it
+        vec = np.array(vec, dtype=np.float32, order="C")
+        vec.setflags(write=False)  # shared between callers
+        key = self.key(text)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (vec, expires)
+            self._bytes += vec.nbytes
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+        return vec
+
+    def get_or_compute(self, text: str, compute):
+        vec = self.get(text)
+        if vec is None:
+            vec = self.put(text, compute(text))
+        return vec
+
+    def _drop(self, key):
+        vec, _ = self._data.pop(key)
+        self._bytes -= vec.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,15 +1,117 @@
+import os
+import queue
+import threading
+import time
+import numpy as np
+import torch
 import streamlit as st
 # import chromadb
+from concurrent.futures import Future
 from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
 from st_keyup import st_keyup
 
 # came from hf download BAAI/bge-small-en-v1.5 --local-dir ./models/bge-small
 DISK_PATH =  "./models/bge-small"
+# identifies vectors produced by this model in on-disk caches (embedding_store.py) and
+# local index snapshots; per backend, since onnx-int8 vectors are not the fp32 ones
+def model_id(backend: str = None) -> str:
+    backend = (backend or os.getenv("embedding_backend", "torch")).lower()
+    return f"{os.path.basename(DISK_PATH)}-{backend}"
 
-# 'cuda' ensures it uses VRAM for high-speed inference
+MODEL_ID = model_id()
+
+# ----------------------------
+# device policy
+# ----------------------------
+# embedding_device in .env: 'auto' (default) picks cuda when a GPU is visible
+# and falls back to the CPU path otherwise; 'cpu' / 'cuda' force one of them.
+# embedding_threads caps the torch intra-op pool on the CPU path (0 = all
+# cores this process is allowed to run on).
+DEVICE_POLICIES = ("auto", "cpu", "cuda")
+
+def resolve_device(policy: str = None) -> str:
+    policy = (policy or os.getenv("embedding_device", "auto")).lower()
+    if policy not in DEVICE_POLICIES:
+        raise ValueError(f"Unknown device policy {policy!r}, expected one of {DEVICE_POLICIES}")
+    if policy == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    if policy == "cuda" and not torch.cuda.is_available():
+        raise RuntimeError("embedding_device=cuda requested but no CUDA device is available")
+    return policy
+
+def available_cpus():
+    # cores this process may run on (respects taskset / container cpusets)
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def physical_cores() -> int:
+    # unique (package, core) pairs on Linux so SMT siblings are not double counted
+    cores = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            package = core = None
+            for line in f:
+                if line.startswith("physical id"):
+                    package = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    core = line.split(":")[1].strip()
+                    cores.add((package, core))
+    except OSError:
+        pass
+    return min(len(cores) or os.cpu_count() or 1, len(available_cpus()))
+
+def configure_cpu(num_threads: int = None, cpus=None) -> int:
+    """
+    Tune torch for CPU inference: optionally pin this process to `cpus`
+    and size the intra-op pool. Returns the thread count in use.
+    """
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if not num_threads:
+        num_threads = int(os.getenv("embedding_threads", "0")) or len(available_cpus())
+    torch.set_num_threads(num_threads)
+    try:
+        # a single sentence batch has nothing to run in parallel across ops
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # can only be set once, before torch starts any parallel work
+        pass
+    return num_threads
+
+def pin_worker(worker_index: int, num_workers: int) -> int:
+    """
+    Give worker `worker_index` of `num_workers` its own contiguous slice of
+    cores so several model processes do not oversubscribe the machine.
+    """
+    cpus = available_cpus()
+    per_worker = max(1, len(cpus) // max(1, num_workers))
+    start = (worker_index * per_worker) % len(cpus)
+    mine = cpus[start:start + per_worker]
+    return configure_cpu(len(mine), mine)
+
+# ----------------------------
+# inference backend
+# ----------------------------
+# embedding_backend in .env: 'torch' (default, SentenceTransformer), 'onnx'
+# or 'onnx-int8' (ONNX Runtime on CPU, see onnx_encoder.py).
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# 'cuda' uses VRAM for high-speed inference, the CPU path is tuned above
 # @st.cache_resource
-def load_model():
-    return SentenceTransformer(DISK_PATH, device='cuda', trust_remote_code=True)
+def load_model(device: str = None, backend: str = None):
+    backend = (backend or os.getenv("embedding_backend", "torch")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    if backend != "torch":
+        import onnx_encoder
+        return onnx_encoder.OnnxEncoder(quantized=backend == "onnx-int8")
+
+    device = resolve_device(device)
+    if device == "cpu":
+        configure_cpu()
+    return SentenceTransformer(DISK_PATH, device=device, trust_remote_code=True)
 
 # Set the global flagfor model object initialization
 _model = None
@@ -28,19 +130,152 @@ def get_model():
 # client = chromadb.PersistentClient(path="./my_vector_db")
 # collection = client.get_or_create_collection(name="recommendations")
 
-def get_embedding(text: str, model_instance=None):
+# ----------------------------
+# query embedding cache (see embedding_cache.py)
+# ----------------------------
+# embedding_cache_entries / embedding_cache_mb / embedding_cache_ttl (seconds,
+# 0 = no expiry) / embedding_cache_casefold (1/0) can be set in .env.
+_cache = None
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            max_entries=int(os.getenv("embedding_cache_entries", "10000")),
+            max_bytes=int(float(os.getenv("embedding_cache_mb", "64")) * 1024 * 1024),
+            ttl=float(os.getenv("embedding_cache_ttl", "0")) or None,
+            casefold=os.getenv("embedding_cache_casefold", "1") == "1",
+        )
+    return _cache
+
+def _encode_one(text: str):
+    m = get_model()
+    with torch.inference_mode():
+        return m.encode(text, normalize_embeddings=True)
+
+def get_embedding(text: str, model_instance=None, use_cache: bool = True):
     """
     Utility function to create embeddings.
     Can be imported and used in other files.
     """
     if not text or not text.strip():
         return []
-    
-    # If no model provided, use the cached global one
+
+    # Generate embedding (normalize_embeddings is recommended for BGE),
+    # repeated queries are answered from the in-process cache
+    if use_cache:
+        return get_cache().get_or_compute(text, _encode_one).tolist()
+    return _encode_one(text).tolist()
+
+# Default number of sentences pushed through the model in one forward pass
+BATCH_SIZE = 64
+
+def get_embeddings(texts, batch_size: int = BATCH_SIZE):
+    """
+    Batched counterpart of get_embedding.
+    Returns a contiguous float32 matrix of shape (len(texts), dim), one
+    normalized row per input text, in input order.
+    """
     m = get_model()
-    
-    # Generate embedding (normalize_embeddings is recommended for BGE)
-    return m.encode(text, normalize_embeddings=True).tolist()
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, m.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    with torch.inference_mode():
+        vecs = m.encode(
+            texts,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    return np.ascontiguousarray(vecs, dtype=np.float32)
+
+# ----------------------------
+# micro-batching for concurrent single-text callers
+# ----------------------------
+# Many threads calling get_embedding at once each pay a full forward pass.
+# The batcher parks their requests for a few milliseconds and encodes
+# whatever has arrived as a single batch.
+MICRO_BATCH_WAIT_MS = 5
+MICRO_BATCH_MAX = 64
+
+class MicroBatcher:
+    def __init__(self, max_batch: int = MICRO_BATCH_MAX, max_wait_ms: float = MICRO_BATCH_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._q = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        # returns a Future resolving to the float32 vector for text
+        fut = Future()
+        self._q.put((text, fut))
+        return fut
+
+    def embed(self, text: str):
+        return self.submit(text).result()
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        # block for the first request, then gather more until the window closes
+        first = self._q.get()
+        if first is None:
+            return None
+        items = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # finish this batch, then stop
+                self._q.put(None)
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            texts = [text for text, _ in items]
+            try:
+                vecs = get_embeddings(texts, batch_size=len(texts))
+            except Exception as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), vec in zip(items, vecs):
+                fut.set_result(vec)
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher()
+        return _batcher
+
+def get_embedding_batched(text: str):
+    """
+    Drop-in replacement for get_embedding when called from many threads:
+    the request is merged with other in-flight texts into one forward pass.
+    """
+    if not text or not text.strip():
+        return []
+    return get_batcher().embed(text).tolist()
 
 def run_ui():
     st.title("Fast Semantic Search")
@@ -0,0 +1,201 @@
+"""
+Persistent embedding store shared across processes.
+
+Vectors are keyed by a SHA-1 of the text and grouped per model id, so a
+re-ingest of an unchanged corpus is answered from disk with no model work.
+
+Layout under cache/embeddings/<model_id>/:
+    meta.json    model id and vector dimension
+    vectors.f32  append-only float32 matrix, one row per text
+    index.bin    append-only 20-byte SHA-1 digests; record i is row i
+    store.lock   advisory lock serializing writers
+
+index.bin is the commit point: a row only exists once its digest has been
+appended, so a crash between the two writes leaves a harmless tail in
+vectors.f32 that the next writer truncates. Readers map vectors.f32 with
+np.memmap and pick up rows appended by other processes on the next lookup.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_DIR = Path(__file__).parent / "cache" / "embeddings"
+DIGEST_SIZE = 20
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+@contextmanager
+def file_lock(path: Path):
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class EmbeddingStore:
+    def __init__(self, model_id: str, root: Path = STORE_DIR):
+        self.model_id = model_id
+        self.dir = Path(root) / model_id
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.dir / "vectors.f32"
+        self.index_path = self.dir / "index.bin"
+        self.lock_path = self.dir / "store.lock"
+        self.meta_path = self.dir / "meta.json"
+
+        self.dim = None
+        self._index = {}     # digest -> row
+        self._rows = 0
+        self._mm = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load_meta()
+
+    def _load_meta(self):
+        if self.meta_path.exists():
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta["model_id"] != self.model_id:
+                raise ValueError(f"Store at {self.dir} belongs to model {meta['model_id']!r}")
+            self.dim = meta["dim"]
+
+    def _refresh(self):
+        # read index records appended since the last look (possibly by another process)
+        size = self.index_path.stat().st_size if self.index_path.exists() else 0
+        rows = size // DIGEST_SIZE
+        if rows <= self._rows:
+            return
+        if self.dim is None:
+            self._load_meta()  # opened before the first writer created the store
+        with open(self.index_path, "rb") as f:
+            f.seek(self._rows * DIGEST_SIZE)
+            blob = f.read((rows - self._rows) * DIGEST_SIZE)
+        for i in range(rows - self._rows):
+            self._index.setdefault(blob[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE], self._rows + i)
+        self._rows = rows
+        self._mm = None
+
+    def matrix(self):
+        """Zero-copy read-only view of every committed row."""
+        with self._lock:
+            # built and sized under the lock, so a concurrent _refresh cannot leave a short map behind
+            mm = self._mm
+            if mm is None:
+                if self._rows == 0:
+                    return np.empty((0, self.dim or 0), dtype=np.float32)
+                mm = self._mm = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            return mm
+
+    def __len__(self):
+        return self._rows
+
+    def lookup(self, keys):
+        # row number per key, -1 where the key is not stored yet
+        with self._lock:
+            self._refresh()
+            return np.array([self._index.get(k, -1) for k in keys], dtype=np.int64)
+
+    def get(self, text: str):
+        row = self.lookup([text_key(text)])[0]
+        return None if row < 0 else self.matrix()[row]
+
+    def append(self, texts, vecs):
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        if len(texts) == 0:
+            return
+        with self._lock, file_lock(self.lock_path):
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"Vector dim {vecs.shape[1]} does not match store dim {self.dim}")
+
+            self._refresh()
+            new_keys, new_rows, seen = [], [], set()
+            for i, text in enumerate(texts):
+                k = text_key(text)
+                if k not in self._index and k not in seen:
+                    seen.add(k)
+                    new_keys.append(k)
+                    new_rows.append(i)
+            if not new_keys:
+                return
+
+            # drop any uncommitted tail left by a crashed writer, then vectors first, index last
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(self._rows * self.dim * 4)
+                f.write(vecs[new_rows].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(new_keys))
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh()
+
+    def get_or_compute(self, texts, compute):
+        """
+        Return a float32 (len(texts), dim) matrix for texts, calling
+        compute(list_of_texts) -> matrix only for texts not on disk yet.
+        """
+        texts = list(texts)
+        rows = self.lookup([text_key(t) for t in texts])
+        missing = np.flatnonzero(rows < 0)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing):
+            # duplicates inside one batch are only computed once
+            todo = list(dict.fromkeys(texts[i] for i in missing))
+            self.append(todo, compute(todo))
+            rows = self.lookup([text_key(t) for t in texts])
+        if len(texts) == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.matrix()[rows], dtype=np.float32)
+
+# ----------------------------
+# shared instances
+# ----------------------------
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(model_id: str = None) -> EmbeddingStore:
+    if model_id is None:
+        import embedding_generator
+        model_id = embedding_generator.MODEL_ID
+    with _stores_lock:
+        if model_id not in _stores:
+            _stores[model_id] = EmbeddingStore(model_id)
+        return _stores[model_id]
+
+def cached_embeddings(texts, model_id: str = None, compute=None):
+    """
+    get_embeddings() backed by the on-disk store: only texts never seen
+    by this model go through the encoder.
+    """
+    if compute is None:
+        import embedding_generator
+        compute = embedding_generator.get_embeddings
+    return get_store(model_id).get_or_compute(texts, compute)
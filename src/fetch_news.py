@@ -1,78 +1,213 @@
-import json
 import os
+import random
+import threading
 import time, requests
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from newsdataapi import NewsDataApiClient
+import news_log
 
 load_dotenv()
 # Configuration
 API_KEY = os.getenv("news_api_key")
-FILE_PATH = Path(__file__).parent / "raw_text" / "news_queue.json"
+FILE_PATH = Path(__file__).parent / "raw_text" / "news_queue.json"   # legacy queue, migrated into news_log
 KEYWORDS = "bitcoin OR crypto OR markets OR technology" 
 COUNTRY="us,in,de,gb,ru"
 LANGUAGE="en"
 CATEGORY="business,technology,world,top,health"
 TZ="asia/kolkata"
 
-api = NewsDataApiClient(apikey=API_KEY)
+# append-only queue (see news_log.py); the old news_queue.json is imported once
+_log = None
+
+def get_log():
+    global _log
+    if _log is None:
+        _log = news_log.open_log(legacy_path=FILE_PATH)
+    return _log
 
 def update_local_storage(new_articles):
-    # Load existing data to prevent duplicates
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = {}
-    else:
-        data = {}
-
-    initial_count = len(data)
-    
-    # processing json object into small parsable objects
-    for art in new_articles:
-        # Use article_id as unique ID to avoid duplicates
-        art_id = art.get("article_id")
-        if art_id not in data:
-            data[art_id] = {
-                "title": art.get("title"),
-                "description": art.get("description"),
-                "url": art.get("link"),
-                "pubDate": art.get("pubDate"),
-                "processed": False  # Flag for your inference script
-            }
-
-    with open(FILE_PATH, "w") as f:
-        json.dump(data, f, indent=4)
-    
-    print(f"Added {len(data) - initial_count} new articles. Total present in file queue: {len(data)}")
-
-def run_ingester():
-    query_params = {
-        "apikey": API_KEY,
-        "country": COUNTRY,
-        "language": LANGUAGE,
-        "category": CATEGORY,
-        "timezone": TZ,
-        "prioritydomain": "top",
-        "image": 0,
-        "video": 0,
-        "removeduplicate": 1
-    }
+    # processing json object into small parsable records
+    records = [
+        {
+            "article_id": art.get("article_id"),
+            "title": art.get("title"),
+            "description": art.get("description"),
+            "url": art.get("link"),
+            "pubDate": art.get("pubDate"),
+            "fetched_at": time.time(),   # for freshness lag in the ingest daemon
+        }
+        for art in new_articles
+    ]
+
+    # only articles with an unseen article_id are appended
+    log = get_log()
+    added = log.append(records)
+
+    print(f"Added {added} new articles. Total present in file queue: {len(log)}")
+    return added
+
+# ----------------------------
+# HTTP session and API calls
+# ----------------------------
+NEWS_API_URL = os.getenv("news_api_url", "https://newsdata.io/api/1/latest")
+HTTP_TIMEOUT = 15
+CATCHUP_MAX_PAGES = int(os.getenv("news_catchup_pages", "5"))   # every page costs one API credit
+
+QUERY_PARAMS = {
+    "apikey": API_KEY,
+    "country": COUNTRY,
+    "language": LANGUAGE,
+    "category": CATEGORY,
+    "timezone": TZ,
+    "prioritydomain": "top",
+    "image": 0,
+    "video": 0,
+    "removeduplicate": 1
+}
+
+class FetchError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after   # seconds the server asked us to wait, if any
+
+def get_session() -> requests.Session:
+    # one pooled keep-alive connection reused across polls; retries are the scheduler's job
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
     try:
-        # Fetching latest news
-        response = requests.get("https://newsdata.io/api/1/latest", params=query_params)
-        if response.status_code == 200:
-            data = response.json()
-            update_local_storage(data.get("results", []))
-    except Exception as e:
-        print(f"Error fetching news: {e}")
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
 
-if __name__ == "__main__":
-    # You can set this to run every 5 seconds
-    while True:
-        run_ingester()
-        print("Waiting 5 seconds...")
-        time.sleep(5)  # Pause execution for 5 seconds
+def fetch_page(session: requests.Session, page=None) -> dict:
+    params = dict(QUERY_PARAMS)
+    if page:
+        params["page"] = page
+    try:
+        response = session.get(NEWS_API_URL, params=params, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        raise FetchError(f"request failed: {e}") from e
 
+    if response.status_code != 200:
+        raise FetchError(
+            f"HTTP {response.status_code}: {response.text[:200]}",
+            status=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+    try:
+        return response.json()
+    except ValueError as e:
+        raise FetchError(f"invalid JSON in response: {e}", status=response.status_code) from e
+
+def run_ingester(session: requests.Session = None, max_pages: int = CATCHUP_MAX_PAGES) -> int:
+    """
+    Fetch the latest articles and append the new ones to the news log.
+
+    Results come newest first. While a whole page is new we may have been
+    away longer than one page covers, so the nextPage cursor is followed
+    until a page contains an article we already have (or max_pages).
+    Returns the number of new articles; raises FetchError on failure.
+    """
+    session = session or get_session()
+    total, page = 0, None
+    for _ in range(max(1, max_pages)):
+        data = fetch_page(session, page)
+        if not isinstance(data, dict) or not isinstance(data.get("results") or [], list):
+            raise FetchError(f"unexpected payload: {str(data)[:200]}")
+        results = data.get("results") or []
+        added = update_local_storage(results)
+        total += added
+        page = data.get("nextPage")
+        if not page or not results or added < len(results):
+            break
+    return total
+
+# ----------------------------
+# adaptive polling
+# ----------------------------
+class PollScheduler:
+    """
+    Picks the delay before the next poll.
+
+    Polls that bring new articles shrink the interval towards min_interval,
+    empty polls stretch it towards max_interval. Errors back off
+    exponentially with full jitter (capped at max_backoff), and a
+    Retry-After from a 429 is always honoured.
+    """
+    def __init__(self, min_interval: float = 5.0, max_interval: float = 300.0,
+                 backoff_base: float = 2.0, max_backoff: float = 900.0,
+                 grow: float = 1.5, shrink: float = 0.5, rng: random.Random = None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.grow = grow
+        self.shrink = shrink
+        self.rng = rng or random.Random()
+        self.interval = min_interval
+        self.failures = 0
+
+    def on_success(self, added: int) -> float:
+        self.failures = 0
+        if added:
+            self.interval = max(self.min_interval, self.interval * self.shrink)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.grow)
+        # small jitter so several ingesters do not poll in lockstep
+        return self.interval * self.rng.uniform(0.9, 1.1)
+
+    def on_error(self, retry_after: float = None) -> float:
+        self.failures += 1
+        cap = min(self.max_backoff, self.backoff_base * (2 ** self.failures))
+        delay = max(self.min_interval, self.rng.uniform(0, cap))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+def run_polling(stop: threading.Event = None, session: requests.Session = None,
+                scheduler: PollScheduler = None, on_added=None):
+    # on_added(n) is called after every poll that appended articles to the log
+    stop = stop or threading.Event()
+    session = session or get_session()
+    scheduler = scheduler or PollScheduler()
+    try:
+        while not stop.is_set():
+            try:
+                added = run_ingester(session)
+                if added and on_added:
+                    on_added(added)
+                delay = scheduler.on_success(added)
+            except FetchError as e:
+                delay = scheduler.on_error(e.retry_after)
+                print(f"Error fetching news: {e} (failure {scheduler.failures}, backing off)")
+            except Exception as e:
+                # anything else (a bad record, a failed log append) must not kill the poller thread
+                delay = scheduler.on_error()
+                print(f"Unexpected error while polling: {e!r} (failure {scheduler.failures}, backing off)")
+            print(f"Next poll in {delay:.1f} seconds...")
+            stop.wait(delay)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    # poll interval adapts to how much news arrives; Ctrl+C to stop
+    try:
+        run_polling()
+    except KeyboardInterrupt:
+        print("Stopped by user")
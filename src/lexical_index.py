@@ -0,0 +1,128 @@
+"""
+BM25 inverted index over the collection text, and hybrid retrieval.
+
+$vectorSearch ranks by meaning, so an exact name ("Wakanda", "Mjolnir")
+can sit below vaguer semantic neighbours. BM25Index scores the same texts
+by term overlap. Postings are stored as CSR arrays (doc ids and term
+frequencies per word), and a query accumulates scores into one dense
+float32 array.
+
+hybrid_search runs the vector path (embed + vector_query) and the BM25
+lookup at the same time and merges the two rankings with reciprocal-rank
+fusion, so the merge costs no more wall-clock time than the slower of the
+two retrievals.
+"""
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from prefix_index import tokenize
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60          # standard reciprocal-rank fusion constant
+FUSION_DEPTH = 20   # hits taken from each retriever before fusing
+
+class BM25Index:
+    def __init__(self, texts, ids=None, k1: float = BM25_K1, b: float = BM25_B):
+        self.texts = list(texts)
+        self.ids = list(ids) if ids is not None else [str(i) for i in range(len(self.texts))]
+        self.k1 = k1
+        self.b = b
+
+        term_counts = [Counter(tokenize(t)) for t in self.texts]
+        self.doc_len = np.array([sum(c.values()) for c in term_counts], dtype=np.float32)
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+        vocab = {}
+        rows = []   # word id -> [(doc, tf)]
+        for doc, counts in enumerate(term_counts):
+            for word, tf in counts.items():
+                w = vocab.setdefault(word, len(vocab))
+                if w == len(rows):
+                    rows.append([])
+                rows[w].append((doc, tf))
+        self.vocab = vocab
+        self.offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(r) for r in rows])
+        self.doc_ids = np.fromiter((d for r in rows for d, _ in r), dtype=np.int64, count=int(self.offsets[-1]))
+        self.tfs = np.fromiter((tf for r in rows for _, tf in r), dtype=np.float32, count=int(self.offsets[-1]))
+
+        n = len(self.texts)
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # per-document length normalisation, computed once
+        self._norm = (self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avg_len, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def scores(self, text: str):
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        for word in set(tokenize(text)):
+            w = self.vocab.get(word)
+            if w is None:
+                continue
+            a, b = self.offsets[w], self.offsets[w + 1]
+            docs, tf = self.doc_ids[a:b], self.tfs[a:b]
+            scores[docs] += self.idf[w] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def query(self, text: str, k: int = 10):
+        """Top-k {id, text, score} by BM25; texts sharing no term are left out."""
+        scores = self.scores(text)
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{"id": self.ids[i], "text": self.texts[i], "score": float(scores[i])} for i in top]
+
+def load_from_collection(coll, batch_size: int = 5000) -> BM25Index:
+    """Build from the text field of the collection (no vectors are read)."""
+    texts, ids = [], []
+    for doc in coll.find({"text": {"$exists": True}}, {"text": 1}).batch_size(batch_size):
+        if doc.get("text"):
+            texts.append(doc["text"])
+            ids.append(str(doc["_id"]))
+    start = time.perf_counter()
+    index = BM25Index(texts, ids)
+    print(f"BM25 index: {len(index.vocab)} terms over {len(texts)} texts in {time.perf_counter() - start:.2f}s")
+    return index
+
+# ----------------------------
+# fusion
+# ----------------------------
+def rrf_fuse(rankings, limit: int = 10, k: int = RRF_K):
+    """
+    Reciprocal-rank fusion: a hit scores sum(1 / (k + rank)) over the
+    rankings it appears in. Hits are matched by id (text when there is
+    no id). The score is rescaled so 1.0 means first in every ranking,
+    which keeps it in the 0..1 range the UI shows.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = hit.get("id") or hit["text"]
+            entry = fused.setdefault(key, {"id": hit.get("id"), "text": hit["text"], "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    best = len(rankings) / (k + 1)
+    out = sorted(fused.values(), key=lambda h: h["score"], reverse=True)[:limit]
+    for hit in out:
+        hit["score"] /= best
+    return out
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+
+def hybrid_search(query: str, vector_search, lexical: BM25Index, limit: int = 10, depth: int = FUSION_DEPTH):
+    """
+    vector_search(query) -> (hits, query_vector) runs on a worker thread
+    while BM25 scores on this one; returns (fused hits, query_vector).
+    """
+    vec_future = _pool.submit(vector_search, query)
+    lexical_hits = lexical.query(query, depth)
+    vector_hits, vec = vec_future.result()
+    return rrf_fuse([vector_hits[:depth], lexical_hits], limit), vec
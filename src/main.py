@@ -1,16 +1,28 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
 import requests
 import sys
-import time
 import os
+import numpy as np
+import bulk_writer
+from corpus import avengers_texts_large
+import embedding_store
+import vector_index
+import atlas_search
+import aiohttp
+import aioconsole
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed # !!! only use if using bulk insertion and processing of vectors
+from concurrent.futures import ThreadPoolExecutor # !!! only use if using bulk insertion and processing of vectors
 
 # ----------------------------
 # external inference endpoints
 # ----------------------------
-EMBED_URL = "https://lamhieu-lightweight-embeddings.hf.space/v1/embeddings" # your bge-m3 embed API
+# your bge-m3 embed API; embed_url=http://localhost:8000/embed uses a local suggest_service.py instead
+# (note its bge-small vectors only match a collection built with bge-small)
+EMBED_URL = os.getenv("embed_url", "https://lamhieu-lightweight-embeddings.hf.space/v1/embeddings")
 # SUGGEST_URL = "http://localhost:8000/suggest" # optional
 
 # ----------------------------
@@ -21,8 +33,11 @@ load_dotenv()  # loads variables from .env into os.environ
 URI_PROTOCOL = "mongodb+srv://"
 DB_NAME = "MLautoCompletionSystem"
 COLL_NAME = "embeddings-collection"
-VECTOR_INDEX = "default"     # must match your Atlas vector index name
 VECTOR_LIMIT = 5
+# 'atlas' runs $vectorSearch on the cluster, 'local' answers from an in-process index
+VECTOR_BACKEND = os.getenv("vector_backend", "atlas").lower()
+# 'lean' results carry only id/text/score; 'full' also ships the stored vectors (diagnostics)
+RESULT_SHAPE = os.getenv("vector_result_shape", "lean").lower()
 mongo_connection_url = os.getenv("mongo_connection_url")
 user_pass= os.getenv("user_pass")
 user_name=os.getenv("user_name")
@@ -61,8 +76,14 @@ def embed(text: str):
 # ----------------------------
 # mongo helpers
 # ----------------------------
-client = MongoClient(CONN_URL)
-coll = client[DB_NAME][COLL_NAME]
+# connected on first use, so the module (and the async path) imports without Atlas settings
+_coll = None
+
+def get_collection():
+    global _coll
+    if _coll is None:
+        _coll = MongoClient(CONN_URL)[DB_NAME][COLL_NAME]
+    return _coll
 
 # Vector aggregation search on a MongoDB collection using a vector index
 # (or general indexes) via a pipeline. This scans a given embedding array
@@ -70,216 +91,42 @@ coll = client[DB_NAME][COLL_NAME]
 # the name of the vector index, and the 'path' parameter specifies the
 # document field over which the index was created.
 
-def vector_query(vec):
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": "vector_index", #name of the created index here
-                "path": "embedding", #name of document field
-                "queryVector": vec,
-                "numCandidates": VECTOR_LIMIT * 20,
-                "limit": VECTOR_LIMIT
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "text": 1,
-                "embedding": 1,  # include the document field to be scanned
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        }
-    ]
-    # print(list(coll.aggregate(pipeline)))
-    return list(coll.aggregate(pipeline))
+_local_index = None
+
+def get_local_index():
+    global _local_index
+    if _local_index is None:
+        _local_index = vector_index.load_or_build(get_collection(), REMOTE_MODEL_ID)
+    return _local_index
+
+def vector_query(vec, include_vectors: bool = None):
+    if include_vectors is None:
+        include_vectors = RESULT_SHAPE == "full"
+    if VECTOR_BACKEND == "local":
+        return get_local_index().query(vec, VECTOR_LIMIT, include_vectors)
+
+    return atlas_search.query(get_collection(), vec, VECTOR_LIMIT, include_vectors)
 
 # ----------------------------
 # storing to atlas (memory-building)
 # ----------------------------
 def store_sentence(text: str, emb):
-    coll.insert_one({
-        "text": text,
-        "embedding": emb,
-        "ts": time.time()
-    })
-
-
-
-avengers_texts_large = [
-            "Iron Man builds a new suit to combat threats.",
-            "Captain America wields his vibranium shield.",
-            "Thor summons lightning with Mjolnir.",
-            "Black Widow infiltrates enemy bases.",
-            "Hawkeye aims his arrows with deadly accuracy.",
-            "The Avengers assemble to stop global catastrophes.",
-            "Loki plots mischief in Asgard and Midgard.",
-            "Thanos seeks the Infinity Stones to reshape the universe.",
-            "Doctor Strange manipulates time to prevent disasters.",
-            "Spider-Man swings through New York fighting crime.",
-            "Black Panther protects Wakanda and its secrets.",
-            "Scarlet Witch struggles with her chaotic powers.",
-            "Vision integrates the Mind Stone within himself.",
-            "The Hulk grows stronger with each transformation.",
-            "Ant-Man shrinks and grows using Pym Particles.",
-            "Wasp fights alongside Ant-Man with agility and stingers.",
-            "Nick Fury recruits heroes to form the Avengers initiative.",
-            "The Battle of New York is the Avengers' first big fight.",
-            "The Snap by Thanos wipes out half the universe.",
-            "Captain Marvel arrives to aid in cosmic battles.",
-            "The Time Heist retrieves Infinity Stones from the past.",
-            "Hawkeye becomes Ronin to fight crime alone.",
-            "Thor loses his hammer but discovers inner strength.",
-            "Loki switches between villain and anti-hero roles.",
-            "Ultron threatens humanity and must be stopped.",
-            "Vision and Scarlet Witch share a complex bond.",
-            "Wakanda provides advanced technology to the Avengers.",
-            "Spider-Man joins Doctor Strange in mystical battles.",
-            "Black Panther showcases unparalleled combat skills.",
-            "Iron Man sacrifices himself to save the universe.",
-            "Captain America returns the Infinity Stones to their timelines.",
-            "The multiverse introduces alternate realities and threats.",
-            "Hawkeye trains his daughter in archery and combat.",
-            "Spider-Man faces the responsibilities of being a hero.",
-            "Thor controls lightning without Mjolnir during battles.",
-            "Scarlet Witch learns to harness her full powers.",
-            "The Guardians of the Galaxy assist in universal threats.",
-            "Ant-Man explores the Quantum Realm to alter events.",
-            "Nick Fury coordinates secret missions to protect Earth.",
-            "Doctor Strange opens portals to fight interdimensional threats.",
-            "The Hulk learns to control his anger and transformations.",
-            "Black Widow undertakes covert S.H.I.E.L.D. missions.",
-            "Thanos' army challenges Earth's mightiest heroes.",
-            "The Avengers must cooperate to defeat powerful enemies.",
-            "Iron Man builds new suits to tackle evolving threats.",
-            "Captain America leads with courage and strategy.",
-            "Thor faces cosmic challenges beyond Asgard.",
-            "Black Panther defends Wakanda while aiding global fights.",
-            "Spider-Man encounters alien invasions in the city.",
-            "Scarlet Witch confronts her dark past to control chaos.",
-            "Vision sacrifices himself for the greater good.",
-            "Ant-Man navigates the Microverse to save the day.",
-            "Hawkeye mentors future generations of heroes.",
-            "The Avengers celebrate victories and mourn losses.",
-            "Doctor Strange trains new sorcerers to defend reality.",
-            "Iron Man mentors Spider-Man in heroics and tech.",
-            "Captain America retires after decades of service.",
-            "Thor journeys across the cosmos to restore balance.",
-            "Black Widow uncovers hidden conspiracies threatening Earth.",
-            "Loki’s schemes create unexpected alliances and conflicts.",
-            "The Avengers confront cosmic entities beyond Earth.",
-            "Spider-Man faces moral dilemmas as a teenage hero.",
-            "Black Panther forges alliances to protect Wakanda and the world.",
-            "Scarlet Witch’s powers grow stronger with training and experience.",
-            "Hulk works with Bruce Banner to find inner peace.",
-            "Ant-Man teams up with the Wasp to combat threats.",
-            "The Infinity Gauntlet determines the fate of all beings.",
-            "The Avengers prevent villains from exploiting alternate universes.",
-            "Nick Fury monitors threats from the shadows.",
-            "Doctor Strange uses magic to maintain the balance of reality.",
-            "Thor battles cosmic forces threatening multiple worlds.",
-            "Iron Man's legacy inspires the next generation.",
-            "Captain America mentors young soldiers in courage and ethics.",
-            "Black Panther protects vibranium while aiding global conflicts.",
-            "Hawkeye uses skill and strategy in every mission.",
-            "Scarlet Witch faces adversaries that challenge her morality.",
-            "Spider-Man balances everyday life with superhero duties.",
-            "The Avengers unite across galaxies to face universal threats.",
-            "Ant-Man invents new technologies to enhance combat effectiveness.",
-            "Vision and Scarlet Witch fight to preserve universal balance.",
-            "Thor adapts to challenges in a universe without Mjolnir.",
-            "Loki manipulates multiverse chaos for his schemes.",
-            "The Avengers’ teamwork is tested in extreme battles.",
-            "Iron Man designs specialized suits for different threats.",
-            "Captain America rallies the team in moments of crisis.",
-            "Thor faces battles that span galaxies.",
-            "Black Widow handles espionage and covert operations.",
-            "Hawkeye tracks enemies with pinpoint accuracy.",
-            "Scarlet Witch navigates her chaotic powers responsibly.",
-            "Spider-Man encounters villains from different dimensions.",
-            "The Guardians of the Galaxy team up with the Avengers.",
-            "Doctor Strange combats threats from other realities.",
-            "Ant-Man explores shrinking technology for tactical advantages.",
-            "Vision integrates logic and emotion in critical decisions.",
-            "Thor learns humility while leading in Asgardian conflicts.",
-            "Loki forms temporary alliances to achieve his goals.",
-            "The Avengers protect Earth from cosmic-scale dangers.",
-            "Iron Man improvises solutions during desperate situations.",
-            "Captain America inspires hope and resilience in teammates.",
-            "Black Panther leverages Wakandan resources for global defense.",
-            "Hawkeye’s precision tips the scales in crucial missions.",
-            "Scarlet Witch adapts her powers for maximum effectiveness.",
-            "Spider-Man’s agility and intellect help him overcome threats.",
-            "The Avengers coordinate multi-front strategies.",
-            "Ant-Man’s ingenuity contributes to complex operations.",
-            "Vision evaluates scenarios with logic and ethics.",
-            "Thor confronts enemies with both strength and wisdom.",
-            "Loki’s cunning complicates the Avengers’ plans.",
-            "Doctor Strange manipulates time and space strategically.",
-            "Black Widow neutralizes high-level threats covertly.",
-            "Hawkeye trains new recruits in strategy and combat.",
-            "Iron Man collaborates with allies to tackle evolving dangers.",
-            "Captain America balances leadership with frontline action.",
-            "Spider-Man learns from older heroes to improve his tactics.",
-            "Scarlet Witch reconciles past mistakes to strengthen resolve.",
-            "Thor builds alliances across realms for critical missions.",
-            "The Avengers respond rapidly to multiversal crises.",
-            "Ant-Man uses shrinking technology to execute daring plans.",
-            "Vision’s ethical judgment guides key team decisions.",
-            "Loki’s mischief occasionally aids the Avengers unknowingly.",
-            "Black Panther demonstrates mastery in combat and diplomacy.",
-            "Doctor Strange advises the team on mystical threats.",
-            "Hawkeye executes precise strikes in high-stakes scenarios.",
-            "Iron Man develops countermeasures against advanced threats.",
-            "Captain America strategizes to maintain team cohesion.",
-            "Spider-Man improvises to overcome unpredictable obstacles.",
-            "Scarlet Witch channels her power responsibly during battles.",
-            "Thor’s strength and experience turn the tide in fights.",
-            "The Avengers coordinate to prevent universal collapse.",
-            "Ant-Man discovers new solutions within the Quantum Realm.",
-            "Vision’s presence ensures ethical decision-making.",
-            "Loki occasionally switches sides when it serves a greater good.",
-            "Black Widow investigates hidden threats across the globe.",
-            "Hawkeye monitors and eliminates high-value targets.",
-            "Iron Man mentors younger heroes in both technology and courage.",
-            "Captain America inspires unity among diverse team members.",
-            "Spider-Man balances personal life with heroic responsibilities.",
-            "Scarlet Witch faces internal and external challenges with resolve.",
-            "Thor confronts threats from both cosmic and earthly origins.",
-            "The Avengers maintain vigilance across all dimensions.",
-            "Ant-Man uses inventive tactics to complement the team.",
-            "Vision provides guidance and support in complex missions.",
-            "Loki’s cunning requires constant vigilance from the Avengers.",
-            "Black Panther ensures Wakanda remains a bastion of strength.",
-            "Doctor Strange protects reality from mystical and interdimensional threats.",
-            "Hawkeye demonstrates expertise in reconnaissance and precision strikes.",
-            "Iron Man’s innovations safeguard the team against emerging dangers.",
-            "Captain America exemplifies leadership in times of crisis.",
-            "Spider-Man contributes with agility, intellect, and ingenuity.",
-            "Scarlet Witch hones her abilities to protect friends and the universe.",
-            "Thor commands the power of thunder and lightning to combat enemies.",
-            "The Avengers unify to face threats too great for any hero alone.",
-            "Ant-Man explores new applications of shrinking and growth technology.",
-            "Vision evaluates and resolves conflicts with calm reasoning.",
-            "Loki’s schemes intersect unpredictably with the Avengers’ missions.",
-            "Black Widow operates covertly to neutralize secret threats.",
-            "Hawkeye ensures mission objectives are achieved with precision.",
-            "Iron Man adapts to evolving threats with creativity and technology.",
-            "Captain America balances strategic oversight with direct action.",
-            "Spider-Man learns and grows from interactions with experienced heroes.",
-            "Scarlet Witch channels her powers with focus and responsibility.",
-            "Thor leads battles with courage, experience, and strength.",
-            "The Avengers’ teamwork allows them to succeed where individuals fail.",
-            "Ant-Man discovers creative solutions within challenging situations.",
-            "Vision assists in planning and executing critical operations.",
-            "Loki’s unpredictable actions create both challenges and opportunities.",
-            "Black Panther leverages Wakanda’s technology and resources effectively.",
-            "Doctor Strange advises the team on mystical and cosmic phenomena."
-        ]
+    # content-hash keyed upsert (see bulk_writer.py): a seed typed twice is stored once
+    return bulk_writer.store_one(get_collection(), text, emb)
 
 
+# vectors from the remote API are cached on disk under their own model id
+REMOTE_MODEL_ID = "bge-m3-remote"
+
+def embed_cached(text: str):
+    vecs = embedding_store.cached_embeddings(
+        [text], REMOTE_MODEL_ID, lambda texts: np.array([embed(t) for t in texts], dtype=np.float32)
+    )
+    return vecs[0].tolist()
+
 def bulk_process_threading(line):
     try:
-        processed_vector = embed(line) #creating embeddings
+        processed_vector = embed_cached(line) #creating embeddings (or reusing an earlier run's)
         store_sentence(line, processed_vector) # inserting the data
     except Exception as e:
         print(e)       
@@ -327,10 +174,116 @@ def main():
             # for future in as_completed(futures):
             #     print(f"Processed: {future.result()}")
 
+# ----------------------------
+# async serving path (aiohttp + motor)
+# ----------------------------
+# One shared HTTP session and one motor client serve every seed. The
+# search and the memory write of a seed run concurrently once its
+# embedding is back, and a newer seed cancels the one still in flight,
+# so a fast typist never waits for stale results.
+ASYNC_HTTP_TIMEOUT = 15
+
+class AsyncRecommender:
+    def __init__(self, embed_url: str = EMBED_URL, coll=None, session=None,
+                 limit: int = VECTOR_LIMIT, store: bool = True):
+        # coll/session are injectable (see dev_fakes.py for local stand-ins)
+        self.embed_url = embed_url
+        self.coll = coll
+        self.session = session
+        self.limit = limit
+        self.store = store
+        self._own_session = session is None
+        self._client = None
+        self._writes = set()   # memory writes still running
+
+    async def start(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=ASYNC_HTTP_TIMEOUT),
+            )
+        if self.coll is None:
+            self._client = AsyncIOMotorClient(CONN_URL)
+            self.coll = self._client[DB_NAME][COLL_NAME]
+        return self
+
+    async def close(self):
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        if self._own_session and self.session is not None:
+            await self.session.close()
+        if self._client is not None:
+            self._client.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def embed(self, text: str):
+        json_data = {'model': 'bge-m3', 'input': text}
+        async with self.session.post(self.embed_url, json=json_data, headers={'accept': 'application/json'}) as r:
+            r.raise_for_status()
+            data = await r.json()
+            return data["data"][0]["embedding"]
+
+    async def vector_query(self, vec):
+        return await atlas_search.query_async(self.coll, vec, self.limit)
+
+    async def store_sentence(self, text: str, emb):
+        # same insert-once upsert as the sync path
+        return await bulk_writer.store_one_async(self.coll, text, emb)
+
+    def _store_in_background(self, text: str, emb):
+        # writes are not cancelled by newer seeds, they finish on their own
+        task = asyncio.create_task(self.store_sentence(text, emb))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return task
+
+    async def handle(self, seed: str):
+        emb = await self.embed(seed)
+        if self.store:
+            self._store_in_background(seed, emb)
+        return await self.vector_query(emb)
+
+async def _show(recommender: AsyncRecommender, seed: str):
+    try:
+        db_hits = await recommender.handle(seed)
+    except Exception as e:  # CancelledError is not an Exception, cancellation passes through
+        print(f"\nerror for {seed!r}: {e}")
+        return
+    print(f"\n--- matches from DB for {seed!r} ---")
+    for d in db_hits:
+        print(f"[DB] {d['text']}")
+    print()
+
+async def async_main(embed_url: str = EMBED_URL, coll=None):
+    print("Async realtime sentence recommender (bge-m3, Atlas vector search)")
+    print("type word → press Enter (a new seed cancels the previous one)\n")
+
+    async with AsyncRecommender(embed_url, coll) as recommender:
+        current = None
+        while True:
+            seed = (await aioconsole.ainput("seed> ")).strip()
+            if not seed:
+                continue
+            if current is not None and not current.done():
+                current.cancel()
+            current = asyncio.create_task(_show(recommender, seed))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Realtime sentence recommender")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="aiohttp + motor serving path (concurrent search/store, cancels stale seeds)")
+    args = parser.parse_args()
     try:
-        main()
-    except KeyboardInterrupt:
+        if args.use_async:
+            asyncio.run(async_main())
+        else:
+            main()
+    except (KeyboardInterrupt, EOFError):
         sys.exit(0)
 
 # or realtime char by char (no return detection) then add below one
@@ -355,139 +308,3 @@ if __name__ == "__main__":
 #             if now - last > 0.25:   # 250ms debounce
 #                 handle(buffer)
 #             last = now
-
-
-
-#  for doing this more sort of in asynchornous way then check below
-# import asyncio
-# import aiohttp
-# import aioconsole
-# from motor.motor_asyncio import AsyncIOMotorClient
-
-# ----------------------------
-# external inference endpoints
-# ----------------------------
-# CONN_URL = "http://localhost:8000/embed"
-# SUGGEST_URL = "http://localhost:8000/suggest"
-
-# ----------------------------
-# mongo config
-# ----------------------------
-# CONN_URL = "mongodb+srv://..."
-# DB_NAME = "recs"
-# COLL_NAME = "sentences"
-# VECTOR_INDEX = "default"
-# VECTOR_LIMIT = 5
-
-# ----------------------------
-# HTTP session (global)
-# ----------------------------
-# session = None
-
-# ----------------------------
-# API wrappers (async)
-# ----------------------------
-# async def embed(text: str):
-#     async with session.post(EMBED_URL, json={"text": text}) as r:
-#         r.raise_for_status()
-#         data = await r.json()
-#         return data["embedding"]
-
-# async def suggest(text: str, k: int = 3):
-#     try:
-#         async with session.post(SUGGEST_URL, json={"text": text, "k": k}) as r:
-#             r.raise_for_status()
-#             data = await r.json()
-#             return data.get("sentences", [])
-#     except:
-#         return []
-
-# ----------------------------
-# Atlas wrappers (async)
-# ----------------------------
-# async def vector_query(coll, vec):
-#     pipeline = [
-#         {
-#             "$vectorSearch": {
-#                 "index": VECTOR_INDEX,
-#                 "path": "embedding",
-#                 "queryVector": vec,
-#                 "numCandidates": VECTOR_LIMIT * 20,
-#                 "limit": VECTOR_LIMIT
-#             }
-#         },
-#         {
-#             "$project": {
-#                 "_id": 0,
-#                 "text": 1,
-#                 "score": {"$meta": "vectorSearchScore"}
-#             }
-#         }
-#     ]
-#     return [d async for d in coll.aggregate(pipeline)]
-
-# optional DB memory growth
-# async def store_sentence(coll, text, emb):
-#     await coll.insert_one({
-#         "text": text,
-#         "embedding": emb,
-#         "ts": asyncio.get_event_loop().time()
-#     })
-
-# ----------------------------
-# unified handler
-# ----------------------------
-# async def handle(seed, coll):
-#     # run embedding + suggestions concurrently
-#     emb_task = asyncio.create_task(embed(seed))
-#     sug_task = asyncio.create_task(suggest(seed, 3))
-#     emb = await emb_task
-#     llm_hits = await sug_task
-
-#     # run vector search
-#     db_hits = await vector_query(coll, emb)
-
-#     # print results
-#     print("\n--- DB matches ---")
-#     for d in db_hits:
-#         print(f"[DB] {d['text']}")
-
-#     print("\n--- Generated suggestions ---")
-#     for s in llm_hits:
-#         print(f"[GEN] {s}")
-
-#     print()
-
-    # optional: store memory
-    # await store_sentence(coll, seed, emb)
-
-# ----------------------------
-# main async loop
-# ----------------------------
-# async def main():
-#     global session
-
-#     session = aiohttp.ClientSession()
-
-#     client = AsyncIOMotorClient(CONN_URL)
-#     coll = client[DB_NAME][COLL_NAME]
-
-#     print("Async realtime sentence recommender (bge-m3 + Atlas)")
-#     print("Type a word → Enter\n")
-
-#     # non-blocking console: aioconsole
-#     while True:
-#         seed = await aioconsole.ainput("seed> ")
-#         seed = seed.strip()
-#         if not seed:
-#             continue
-#         try:
-#             await handle(seed, coll)
-#         except KeyboardInterrupt:
-#             break
-
-#     await session.close()
-
-# if __name__ == "__main__":
-#     asyncio.run(main())
-
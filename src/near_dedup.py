@@ -0,0 +1,309 @@
+"""
+Near-duplicate detection for the embeddings collection.
+
+Exact dedup (content_hash) misses paraphrases and near-identical lines
+("Iron Man builds a new suit" / "Iron Man builds new suits"), which then
+crowd the top-k of vector_query. This pass finds them in two steps:
+
+1. Candidates: MinHash signatures over character shingles of the
+   normalized text, split into LSH bands. Two documents are candidates
+   when any band matches, i.e. roughly when their shingle Jaccard
+   similarity is above (1 / BANDS) ** (1 / ROWS).
+2. Verification: cosine similarity of the stored embeddings for candidate
+   pairs only, computed as blocked matrix products. Pairs at or above
+   COSINE_THRESHOLD are duplicates.
+
+Verified pairs are merged into clusters. The document seen first (the
+oldest by ts) is kept, and the rest are reported or deleted.
+
+The pass is incremental. The band keys of every kept document, their ids
+and a ts watermark are saved under cache/near_dedup/<collection>/, so a
+later run only reads documents newer than the watermark. It compares them
+against everything seen before, fetching the embeddings of old candidates
+by id.
+"""
+import argparse
+import json
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+from bson import json_util
+
+import checkpoint
+import vector_codec
+from embedding_cache import normalize_text
+
+SHINGLE = 5                # characters per shingle
+NUM_PERM = 64              # MinHash permutations
+BANDS = 16                 # LSH bands of NUM_PERM // BANDS rows each
+ROWS = NUM_PERM // BANDS
+COSINE_THRESHOLD = 0.95
+MAX_BUCKET = 256           # larger LSH buckets are skipped (boilerplate, not paraphrases)
+BLOCK = 1024               # rows per matrix-product block during verification
+CHUNK_DOCS = 20_000        # new documents processed per round
+TS_SLACK = 300             # re-read this many seconds before the watermark (writer threads finish out of order)
+SEED = 1234                # fixed, band keys must be comparable across runs
+
+STATE_DIR = Path(__file__).parent / "cache" / "near_dedup"
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MULT = _rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+# ----------------------------
+# MinHash / LSH
+# ----------------------------
+def shingles(text: str) -> np.ndarray:
+    text = normalize_text(text)
+    if len(text) <= SHINGLE:
+        grams = {text}
+    else:
+        grams = {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams), dtype=np.uint64, count=len(grams))
+
+def minhash(texts) -> np.ndarray:
+    """(n, NUM_PERM) signatures; each row is the min of NUM_PERM universal hashes over the shingles."""
+    sigs = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        x = shingles(text)
+        sigs[i] = ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+    return sigs
+
+def band_keys(sigs: np.ndarray) -> np.ndarray:
+    # one uint64 per band (wrapping multiply-add of the band's rows)
+    return (sigs.reshape(len(sigs), BANDS, ROWS) * _BAND_MULT).sum(axis=2, dtype=np.uint64)
+
+def candidate_pairs(keys: np.ndarray, first_new: int) -> np.ndarray:
+    """
+    (m, 2) array of row pairs i < j sharing at least one band, where j is
+    a new row (>= first_new). Pairs among old rows were checked before.
+    """
+    pairs = set()
+    for b in range(BANDS):
+        order = np.argsort(keys[:, b], kind="stable")
+        sorted_keys = keys[order, b]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(sorted_keys)])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            if size > MAX_BUCKET:
+                continue
+            members = np.sort(order[start:start + size])
+            if members[-1] < first_new:
+                continue
+            for jj in range(1, size):
+                j = int(members[jj])
+                if j >= first_new:
+                    pairs.update((int(i), j) for i in members[:jj])
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.array(sorted(pairs), dtype=np.int64)
+
+# ----------------------------
+# verification
+# ----------------------------
+def _normalize(mat):
+    mat = np.asarray(mat, dtype=np.float32)
+    return mat / np.clip(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12, None)
+
+def pair_cosines(pairs: np.ndarray, vectors: np.ndarray, block: int = BLOCK) -> np.ndarray:
+    """
+    Cosine of every (i, j) pair over rows of `vectors`, computed per block of
+    left rows as one (block, d) @ (d, cols) product over the right rows that
+    block actually needs.
+    """
+    out = np.empty(len(pairs), dtype=np.float32)
+    if not len(pairs):
+        return out
+    vectors = _normalize(vectors)
+    order = np.argsort(pairs[:, 0], kind="stable")
+    left_rows = np.unique(pairs[:, 0])
+    for s in range(0, len(left_rows), block):
+        rows = left_rows[s:s + block]
+        sel = order[np.isin(pairs[order, 0], rows)]
+        cols = np.unique(pairs[sel, 1])
+        sims = vectors[rows] @ vectors[cols].T
+        out[sel] = sims[np.searchsorted(rows, pairs[sel, 0]), np.searchsorted(cols, pairs[sel, 1])]
+    return out
+
+def clusters(pairs: np.ndarray):
+    """{kept_row: [duplicate rows]}; the lowest row (seen first) of each cluster is kept."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs.tolist():
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for x in list(parent):
+        root = find(x)
+        if x != root:
+            groups.setdefault(root, []).append(x)
+    return groups
+
+# ----------------------------
+# incremental state
+# ----------------------------
+class NearDupState:
+    def __init__(self, name: str, root: Path = STATE_DIR):
+        self.dir = Path(root) / name
+        self.meta_path = self.dir / "meta.json"
+        self.keys_path = self.dir / "keys.npy"
+        self.ids_path = self.dir / "ids.json"
+        self.params = {"shingle": SHINGLE, "num_perm": NUM_PERM, "bands": BANDS, "seed": SEED}
+        self.keys = np.empty((0, BANDS), dtype=np.uint64)
+        self.ids = []
+        self.watermark = None
+        self._load()
+
+    def _load(self):
+        if not self.meta_path.exists():
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta.get("params") != self.params:
+            print("near-dup parameters changed; starting a full sweep")
+            return
+        self.keys = np.load(self.keys_path)
+        with open(self.ids_path) as f:
+            self.ids = json_util.loads(f.read())
+        self.watermark = meta["watermark"]
+
+    def add(self, keys, ids, watermark):
+        self.keys = np.concatenate([self.keys, keys])
+        self.ids.extend(ids)
+        # slack re-reads can see documents older than the current watermark
+        self.watermark = watermark if self.watermark is None else max(self.watermark, watermark)
+
+    def save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.keys_path.with_name("keys.tmp.npy")
+        np.save(tmp, self.keys)
+        os.replace(tmp, self.keys_path)
+        tmp = self.ids_path.with_name("ids.json.tmp")
+        tmp.write_text(json_util.dumps(self.ids))
+        os.replace(tmp, self.ids_path)
+        # meta last: it is what marks the other two as current
+        checkpoint.atomic_write_json(self.meta_path, {"params": self.params, "watermark": self.watermark})
+
+    def reset(self):
+        self.keys = np.empty((0, BANDS), dtype=np.uint64)
+        self.ids = []
+        self.watermark = None
+
+# ----------------------------
+# collection pass
+# ----------------------------
+def _new_docs(coll, watermark, known):
+    query = {"embedding": {"$exists": True}}
+    if watermark is not None:
+        query["ts"] = {"$gt": watermark - TS_SLACK}
+    cursor = (coll.find(query, {"text": 1, "embedding": 1, "codec": 1, "ts": 1})
+              .sort("ts", 1).allow_disk_use(True).batch_size(2000))
+    for doc in cursor:
+        if doc.get("text") and doc["_id"] not in known:
+            doc["embedding"] = vector_codec.decode_doc(doc)
+            yield doc
+
+def _fetch_vectors(coll, ids):
+    found = {doc["_id"]: vector_codec.decode_doc(doc)
+             for doc in coll.find({"_id": {"$in": list(ids)}}, {"embedding": 1, "codec": 1})}
+    return [found.get(i) for i in ids]
+
+def _process_chunk(coll, state, docs, threshold):
+    first_new = len(state.ids)
+    new_keys = band_keys(minhash([d["text"] for d in docs]))
+    pairs = candidate_pairs(np.concatenate([state.keys, new_keys]), first_new)
+
+    # embeddings: new rows are in hand, old candidate rows are fetched by id
+    rows = np.unique(pairs)
+    old_rows = rows[rows < first_new]
+    old_vecs = dict(zip(old_rows.tolist(), _fetch_vectors(coll, [state.ids[r] for r in old_rows])))
+    dim = len(docs[0]["embedding"])
+    local = {}
+    vectors = []
+    for r in rows.tolist():
+        vec = docs[r - first_new]["embedding"] if r >= first_new else old_vecs.get(r)
+        if vec is None or len(vec) != dim:
+            continue  # deleted meanwhile or from another model
+        local[r] = len(vectors)
+        vectors.append(vec)
+    pairs = pairs[np.array([i in local and j in local for i, j in pairs.tolist()], dtype=bool)]
+
+    local_pairs = np.array([[local[i], local[j]] for i, j in pairs.tolist()], dtype=np.int64).reshape(-1, 2)
+    sims = pair_cosines(local_pairs, np.asarray(vectors, dtype=np.float32)) if len(local_pairs) else np.empty(0)
+    verified = pairs[sims >= threshold]
+
+    found = []
+    duplicate_rows = set()
+    for kept, dups in clusters(verified).items():
+        kept_id = state.ids[kept] if kept < first_new else docs[kept - first_new]["_id"]
+        for r in dups:
+            if r < first_new:
+                continue  # an old document reached through a new one; it was kept before, leave it
+            duplicate_rows.add(r)
+            found.append({"_id": docs[r - first_new]["_id"], "text": docs[r - first_new]["text"], "kept": kept_id})
+
+    # only surviving new documents become part of the state
+    survivors = [r for r in range(len(docs)) if r + first_new not in duplicate_rows]
+    state.add(new_keys[survivors], [docs[r]["_id"] for r in survivors], max(d.get("ts", 0) for d in docs))
+    return found
+
+def find_near_duplicates(coll, state: NearDupState, threshold: float = COSINE_THRESHOLD,
+                         chunk_docs: int = CHUNK_DOCS):
+    """
+    Yield lists of {_id, text, kept} for duplicates among documents newer
+    than the state's watermark, one list per processed chunk. The state is
+    advanced in memory; call state.save() once the duplicates are handled.
+    """
+    known = set(state.ids)
+    chunk = []
+    for doc in _new_docs(coll, state.watermark, known):
+        chunk.append(doc)
+        if len(chunk) >= chunk_docs:
+            yield _process_chunk(coll, state, chunk, threshold)
+            chunk = []
+    if chunk:
+        yield _process_chunk(coll, state, chunk, threshold)
+
+def main():
+    import deduplicator
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate texts (MinHash/LSH + embedding cosine)")
+    parser.add_argument("--threshold", type=float, default=COSINE_THRESHOLD, help="cosine needed to call a pair duplicate")
+    parser.add_argument("--full", action="store_true", help="ignore the saved state and sweep the whole collection")
+    parser.add_argument("--delete", action="store_true", help="delete the duplicates (default: report only)")
+    args = parser.parse_args()
+
+    coll = deduplicator.get_collection()
+    state = NearDupState(deduplicator.COLL_NAME)
+    if args.full:
+        state.reset()
+    print(f"Scanning documents newer than {state.watermark} ({len(state.ids)} already indexed)...")
+
+    total = deleted = 0
+    for found in find_near_duplicates(coll, state, args.threshold):
+        total += len(found)
+        for dup in found[:5]:
+            print(f"  {dup['text'][:80]!r}  ~  kept {dup['kept']}")
+        if args.delete and found:
+            deleted += coll.delete_many({"_id": {"$in": [d["_id"] for d in found]}}).deleted_count
+
+    print(f"Found {total} near-duplicates; deleted {deleted}.")
+    if args.delete:
+        state.save()  # a report-only run leaves the watermark where it was
+    else:
+        print("Report only; re-run with --delete to remove them and advance the watermark.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Append-only news queue, replacing the rewrite-the-whole-file news_queue.json.
+
+Layout under raw_text/news_log/:
+    segment-000001.jsonl  one article per line, only the active segment grows
+    ACTIVE                number of the active segment, swapped with os.replace
+    articles.idx          append-only article ids, one per line, for dedup
+    log.lock              advisory lock serializing writers
+
+An append costs only the new records, whatever the history size. Once the
+active segment passes SEGMENT_BYTES the next one is created and ACTIVE is
+switched atomically. A record is only visible to readers once its line is
+complete, and a torn tail left by a crash is cut off before the next append.
+
+Consumers track a position (segment, byte offset) and read only what was
+appended after it; bulk_insertion keeps that position in its checkpoint.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+from embedding_store import file_lock
+
+LOG_DIR = Path(__file__).parent / "raw_text" / "news_log"
+LEGACY_QUEUE = Path(__file__).parent / "raw_text" / "news_queue.json"
+SEGMENT_BYTES = 8 * 1024 * 1024
+
+def _segment_name(n: int) -> str:
+    return f"segment-{n:06d}.jsonl"
+
+def _fsync_append(path: Path, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+class NewsLog:
+    def __init__(self, root: Path = LOG_DIR, segment_bytes: int = SEGMENT_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.index_path = self.root / "articles.idx"
+        self.active_path = self.root / "ACTIVE"
+        self.lock_path = self.root / "log.lock"
+        self._ids = set()
+        self._index_offset = 0
+        self._lock = threading.Lock()
+        self._refresh_ids()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, article_id):
+        return article_id in self._ids
+
+    def _refresh_ids(self):
+        # pick up ids appended since the last look (complete lines only)
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._index_offset += len(raw)
+                self._ids.add(raw.decode("utf-8").rstrip("\n"))
+
+    def segments(self):
+        return sorted(int(p.name[8:14]) for p in self.root.glob("segment-*.jsonl"))
+
+    def active_segment(self) -> int:
+        if self.active_path.exists():
+            return int(self.active_path.read_text().strip())
+        segments = self.segments()
+        return segments[-1] if segments else 1
+
+    def segment_path(self, n: int) -> Path:
+        return self.root / _segment_name(n)
+
+    def _roll_over(self, current: int) -> int:
+        nxt = current + 1
+        self.segment_path(nxt).touch()
+        tmp = self.active_path.with_name("ACTIVE.tmp")
+        tmp.write_text(str(nxt))
+        os.replace(tmp, self.active_path)
+        return nxt
+
+    @staticmethod
+    def _cut_torn_tail(path: Path, chunk: int = 4096):
+        # a crash mid-append can leave a partial last line; drop it
+        if not path.exists():
+            return
+        with open(path, "r+b") as f:
+            end = pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                step = min(chunk, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                if pos == end and block.endswith(b"\n"):
+                    return
+                nl = block.rfind(b"\n")
+                if nl >= 0:
+                    f.truncate(pos - step + nl + 1)
+                    return
+                pos -= step
+            f.truncate(0)
+
+    def append(self, records) -> int:
+        """
+        Append records whose article_id is not in the log yet.
+        Returns how many were new.
+        """
+        with self._lock, file_lock(self.lock_path):
+            self._refresh_ids()
+            fresh, seen = [], set()
+            for rec in records:
+                art_id = rec.get("article_id")
+                if art_id and art_id not in self._ids and art_id not in seen:
+                    seen.add(art_id)
+                    fresh.append(rec)
+            if not fresh:
+                return 0
+
+            seg = self.active_segment()
+            path = self.segment_path(seg)
+            self._cut_torn_tail(path)
+            if path.exists() and path.stat().st_size >= self.segment_bytes:
+                seg = self._roll_over(seg)
+                path = self.segment_path(seg)
+            elif not self.active_path.exists():
+                self.active_path.write_text(str(seg))
+
+            # records first, then the dedup index (a crash in between only
+            # risks re-appending an article, which the idempotent ingest absorbs)
+            _fsync_append(path, b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in fresh))
+            self._cut_torn_tail(self.index_path)
+            _fsync_append(self.index_path, b"".join(r["article_id"].encode("utf-8") + b"\n" for r in fresh))
+            self._refresh_ids()
+            return len(fresh)
+
+    def read_from(self, position=None):
+        """
+        Yield (record, position_after) for every complete record after
+        `position` = [segment, byte offset] (None = from the beginning).
+        """
+        segment, offset = position if position else (0, 0)
+        for seg in self.segments():
+            if seg < segment:
+                continue
+            start = offset if seg == segment else 0
+            with open(self.segment_path(seg), "rb") as f:
+                f.seek(start)
+                pos = start
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # still being written
+                    pos += len(raw)
+                    yield json.loads(raw), [seg, pos]
+
+# ----------------------------
+# one-off import of the legacy JSON queue
+# ----------------------------
+def migrate_json_queue(log: NewsLog, json_path: Path) -> int:
+    """Copy articles from the old news_queue.json into the log (skips known ids)."""
+    json_path = Path(json_path)
+    if not json_path.exists():
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            return 0
+    records = []
+    for art_id, art in data.items():
+        rec = {"article_id": art_id}
+        rec.update({k: v for k, v in art.items() if k != "processed"})
+        records.append(rec)
+    return log.append(records)
+
+def open_log(root: Path = LOG_DIR, legacy_path: Path = LEGACY_QUEUE) -> NewsLog:
+    """The news log; an empty one first imports the legacy news_queue.json."""
+    log = NewsLog(root)
+    if len(log) == 0:
+        migrated = migrate_json_queue(log, legacy_path)
+        if migrated:
+            print(f"Imported {migrated} articles from {Path(legacy_path).name} into the news log")
+    return log
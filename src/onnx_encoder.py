@@ -0,0 +1,179 @@
+"""
+ONNX Runtime backend for the bge-small encoder.
+
+The transformer under ./models/bge-small is exported to ONNX once and the
+file is cached next to it (./models/bge-small-onnx). Later runs load the
+cached graph straight into an ONNX Runtime CPU session, optionally as a
+dynamically int8-quantized copy. OnnxEncoder.encode mirrors the subset of
+SentenceTransformer.encode that embedding_generator uses, so either can sit
+behind get_model().
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+import embedding_generator
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional dependency, only needed for this backend
+    ort = None
+
+ONNX_DIR = Path(embedding_generator.DISK_PATH + "-onnx")
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+META_FILE = "export.json"
+OPSET = 17
+
+def _require_ort():
+    if ort is None:
+        raise RuntimeError("onnxruntime is not installed: pip install onnxruntime "
+                           "(or set embedding_backend=torch)")
+
+# ----------------------------
+# one-off export / quantization
+# ----------------------------
+def export(model_path: str = embedding_generator.DISK_PATH, out_dir: Path = ONNX_DIR):
+    """
+    Export the SentenceTransformer's transformer to out_dir/model.onnx and
+    record the pooling settings the runtime needs to reproduce its output.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_path, device="cpu", trust_remote_code=True)
+    transformer = st_model[0].auto_model.eval()
+    pooling = st_model[1].get_pooling_mode_str()
+
+    dummy = st_model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dynamic = {name: {0: "batch", 1: "seq"} for name in input_names + ["last_hidden_state"]}
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LastHiddenState(transformer),
+            tuple(dummy[n] for n in input_names),
+            str(out_dir / FP32_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=OPSET,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+
+    meta = {
+        "source": str(model_path),
+        "pooling": pooling,
+        "max_seq_length": st_model.max_seq_length,
+        "dim": st_model.get_sentence_embedding_dimension(),
+        "input_names": input_names,
+    }
+    with open(out_dir / META_FILE, "w") as f:
+        json.dump(meta, f, indent=4)
+    return out_dir / FP32_FILE
+
+def quantize(out_dir: Path = ONNX_DIR):
+    # dynamic int8: weights quantized offline, activations at run time
+    _require_ort()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(out_dir / FP32_FILE), str(out_dir / INT8_FILE), weight_type=QuantType.QInt8)
+    return out_dir / INT8_FILE
+
+def ensure_exported(quantized: bool = False, out_dir: Path = ONNX_DIR) -> Path:
+    # export / quantize only when the cached file is missing
+    if not (out_dir / FP32_FILE).exists() or not (out_dir / META_FILE).exists():
+        print(f"--- Exporting {embedding_generator.DISK_PATH} to ONNX (one-off) ---")
+        export(out_dir=out_dir)
+    if quantized and not (out_dir / INT8_FILE).exists():
+        print("--- Quantizing ONNX model to int8 (one-off) ---")
+        quantize(out_dir)
+    return out_dir / (INT8_FILE if quantized else FP32_FILE)
+
+# ----------------------------
+# runtime
+# ----------------------------
+class OnnxEncoder:
+    def __init__(self, quantized: bool = False, num_threads: int = None, out_dir: Path = ONNX_DIR):
+        _require_ort()
+        from transformers import AutoTokenizer
+
+        path = ensure_exported(quantized, out_dir)
+        with open(out_dir / META_FILE) as f:
+            self.meta = json.load(f)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.intra_op_num_threads = num_threads or len(embedding_generator.available_cpus())
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(self.meta["source"])
+        self.quantized = quantized
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def _pool(self, hidden, mask):
+        if self.meta["pooling"] == "cls":
+            return hidden[:, 0]
+        mask = mask[..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.meta["dim"]), dtype=np.float32)
+
+        # length-sorted batches keep padding (and wasted compute) small
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.meta["max_seq_length"],
+                return_tensors="np",
+            )
+            feeds = {name: enc[name].astype(np.int64) for name in self.meta["input_names"]}
+            hidden = self.session.run(None, feeds)[0]
+            out[idx] = self._pool(hidden, enc["attention_mask"])
+
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+# ----------------------------
+# parity against the SentenceTransformer reference
+# ----------------------------
+PARITY_MIN_COSINE = 0.99
+
+def parity_check(texts, quantized: bool = False, reference=None):
+    """
+    Encode texts with both backends and return the per-text cosine
+    similarity. Raises if any text falls below PARITY_MIN_COSINE.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    reference = reference or SentenceTransformer(embedding_generator.DISK_PATH, device="cpu", trust_remote_code=True)
+    expected = reference.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    actual = OnnxEncoder(quantized=quantized).encode(texts, normalize_embeddings=True)
+    cosines = np.einsum("ij,ij->i", expected.astype(np.float32), actual)
+    worst = float(cosines.min())
+    if worst < PARITY_MIN_COSINE:
+        raise AssertionError(f"ONNX{' int8' if quantized else ''} parity failed: "
+                             f"min cosine {worst:.4f} < {PARITY_MIN_COSINE}")
+    return cosines
@@ -0,0 +1,162 @@
+"""
+In-memory prefix index for very short autocomplete inputs.
+
+For 1-3 characters the query embedding carries almost no meaning, so a
+vector search returns near-random neighbours. This index completes the
+last typed word lexically instead:
+
+    words        sorted array of every distinct word in the stored texts
+    freq         number of texts containing each word
+    postings     CSR arrays: texts containing word w are
+                 post_ids[post_offsets[w]:post_offsets[w + 1]], shortest first
+
+A prefix maps to a contiguous range of `words` (two bisections). The
+best-ranked words of every prefix up to PRECOMPUTE_CHARS long are worked
+out at build time, so a short query is a dict lookup plus a few postings
+reads. Results are shaped like vector_query hits (id, text, score), and the
+score is the word's weight relative to the top completion.
+
+Words are weighted by frequency, except stopwords ("the", "with", "in"),
+which are the most frequent words of any corpus but useless completions:
+they rank after every content word sharing the prefix.
+"""
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+PRECOMPUTE_CHARS = 3
+TOP_WORDS = 20
+_TOKEN = re.compile(r"\w[\w'-]*")
+_MAX_CHAR = "\U0010ffff"
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be because been before but by can could did do does
+for from had has have he her here him his how i if in into is it its just me more most my no not
+now of off on once only or other our out over own same she should so some such than that the their
+them then there these they this those through to too under until up very was we were what when
+where which while who why will with would you your
+""".split())
+
+def tokenize(text: str):
+    return _TOKEN.findall(normalize_text(text))
+
+class PrefixIndex:
+    def __init__(self, texts, ids=None, precompute_chars: int = PRECOMPUTE_CHARS, top_words: int = TOP_WORDS):
+        self.texts = list(texts)
+        self.ids = list(ids) if ids is not None else [str(i) for i in range(len(self.texts))]
+        self.top_words = top_words
+
+        doc_words = [set(tokenize(t)) for t in self.texts]
+        counts = Counter(w for words in doc_words for w in words)
+        self.words = sorted(counts)
+        self.freq = np.array([counts[w] for w in self.words], dtype=np.int64)
+        # ranking weight: frequency, squeezed below 1 for stopwords so any content word outranks them
+        stop = np.array([w in STOPWORDS for w in self.words], dtype=bool)
+        self.weight = self.freq.astype(np.float64)
+        self.weight[stop] /= (self.freq.max() + 1) if len(self.freq) else 1
+        self._word_id = {w: i for i, w in enumerate(self.words)}
+
+        # postings, each list ordered shortest text first (closest to a completion)
+        by_length = sorted(range(len(self.texts)), key=lambda i: len(self.texts[i]))
+        lists = [[] for _ in self.words]
+        for tid in by_length:
+            for w in doc_words[tid]:
+                lists[self._word_id[w]].append(tid)
+        self.post_offsets = np.zeros(len(self.words) + 1, dtype=np.int64)
+        self.post_offsets[1:] = np.cumsum([len(l) for l in lists])
+        self.post_ids = np.fromiter((tid for l in lists for tid in l), dtype=np.int64, count=int(self.post_offsets[-1]))
+
+        self._top = {}
+        for n in range(1, precompute_chars + 1):
+            self._precompute(n)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _precompute(self, n: int):
+        # words are sorted, so all words sharing their first n chars are one run
+        start = 0
+        while start < len(self.words):
+            prefix = self.words[start][:n]
+            if len(prefix) < n:
+                start += 1  # word shorter than n, its longer siblings start their own runs
+                continue
+            end = bisect_left(self.words, prefix + _MAX_CHAR, start)
+            self._top[prefix] = self._rank(start, end)
+            start = end
+
+    def _rank(self, lo: int, hi: int):
+        weight = self.weight[lo:hi]
+        k = min(self.top_words, len(weight))
+        top = np.argpartition(-weight, k - 1)[:k] if k < len(weight) else np.arange(len(weight))
+        top = top[np.lexsort((top, -weight[top]))]   # by weight, then alphabetically
+        return (lo + top).tolist()
+
+    def _word_range(self, prefix: str):
+        lo = bisect_left(self.words, prefix)
+        return lo, bisect_left(self.words, prefix + _MAX_CHAR, lo)
+
+    def _postings(self, w: int):
+        return self.post_ids[self.post_offsets[w]:self.post_offsets[w + 1]]
+
+    def complete(self, prefix: str):
+        """Word ids starting with prefix, highest weight first (at most top_words)."""
+        top = self._top.get(prefix)
+        if top is None:
+            lo, hi = self._word_range(prefix)
+            top = self._rank(lo, hi) if hi > lo else []
+        return top
+
+    def complete_words(self, prefix: str, k: int = 10):
+        return [(self.words[w], int(self.freq[w])) for w in self.complete(normalize_text(prefix))[:k]]
+
+    def query(self, text: str, k: int = 10):
+        """
+        Texts completing the last word of `text`, ranked by the completed
+        word's weight. Earlier words, if any, must all appear in the text.
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        *context, prefix = tokens
+        allowed = None
+        for word in context:
+            w = self._word_id.get(word)
+            if w is None:
+                return []
+            ids = set(self._postings(w).tolist())
+            allowed = ids if allowed is None else allowed & ids
+
+        top = self.complete(prefix)
+        if not top:
+            return []
+        best = float(self.weight[top[0]])
+        results, seen = [], set()
+        for w in top:
+            score = float(self.weight[w]) / best
+            for tid in self._postings(w):
+                tid = int(tid)
+                if tid in seen or (allowed is not None and tid not in allowed):
+                    continue
+                seen.add(tid)
+                results.append({"id": self.ids[tid], "text": self.texts[tid], "score": score,
+                                "completion": self.words[w]})
+                if len(results) >= k:
+                    return results
+        return results
+
+def load_from_collection(coll, batch_size: int = 5000) -> PrefixIndex:
+    """Build from the text field of the collection (no vectors are read)."""
+    texts, ids = [], []
+    for doc in coll.find({"text": {"$exists": True}}, {"text": 1}).batch_size(batch_size):
+        if doc.get("text"):
+            texts.append(doc["text"])
+            ids.append(str(doc["_id"]))
+    start = time.perf_counter()
+    index = PrefixIndex(texts, ids)
+    print(f"Prefix index: {len(index.words)} words over {len(texts)} texts in {time.perf_counter() - start:.2f}s")
+    return index
@@ -0,0 +1,137 @@
+"""
+Prefix-aware result cache for the autocomplete box.
+
+Queries arrive as a growing prefix ("iro", "iron", "iron m"). Results are
+cached per normalized prefix together with the query vector:
+
+    * an exact hit (retyped / backspaced text) skips both the encode and
+      the vector search;
+    * otherwise the query is embedded, and if the longest cached prefix of
+      it sits within REUSE_COSINE of the vector that fetched that prefix's
+      candidates, the keystroke barely moved the query: the candidates are
+      re-scored against the new vector and re-sorted, skipping the search.
+
+The reuse check always compares against the origin search vector, so a
+chain of small keystrokes cannot drift away from the candidates forever.
+Re-scoring needs the candidates' vectors. They come from an "embedding"
+field on the hits (full result shape) or, only when a reuse is about to
+happen, from vectors(hits) -> (n, dim); they are fetched once per search
+and kept with every entry that reuses it. Results keep the shape search()
+gave them. Without either source there is no prefix reuse, only exact hits.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+REUSE_COSINE = 0.97
+
+def _rescore(hits, cands, vec):
+    # hits and their vectors scored for vec with Atlas' (1 + cosine) / 2, best first
+    cos = (cands @ vec) / (np.linalg.norm(cands, axis=1) * np.linalg.norm(vec) + 1e-12)
+    order = np.argsort(-cos, kind="stable")
+    return [dict(hits[i], score=float((1 + cos[i]) / 2)) for i in order], cands[order]
+
+def _vectors(hits):
+    # (n, dim) matrix of the hits' own vectors, None when they carry none
+    if not hits or any("embedding" not in h for h in hits):
+        return None
+    return np.asarray([h["embedding"] for h in hits], dtype=np.float32)
+
+class PrefixResultCache:
+    def __init__(self, max_entries: int = 5000, reuse_cosine: float = REUSE_COSINE, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.reuse_cosine = reuse_cosine
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (results, vec, origin vec, candidate vectors, expires_at)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.prefix_reuses = 0
+        self.searches = 0
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[4] is not None and entry[4] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _put(self, key, results, vec, origin, cands):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (results, vec, origin, cands, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _parent(self, key):
+        # (key, entry) of the longest cached proper prefix of key
+        for end in range(len(key) - 1, 0, -1):
+            entry = self._get(key[:end])
+            if entry is not None:
+                return key[:end], entry
+        return None, None
+
+    def get_or_search(self, query: str, embed, search, vectors=None):
+        """
+        Returns (results, query_vector). embed(text) -> vector and
+        search(vector) -> results are only called when the cache cannot answer;
+        vectors(results) -> (n, dim) only when a prefix is about to be reused
+        and its hits came without vectors (None: skip the reuse).
+        """
+        key = normalize_text(query)
+        with self._lock:
+            self.lookups += 1
+            entry = self._get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return entry[0], entry[1]
+
+        vec = np.asarray(embed(query), dtype=np.float32)
+        with self._lock:
+            parent_key, parent = self._parent(key)
+        results = None
+        if parent is not None and float(parent[2] @ vec) >= self.reuse_cosine:
+            hits, parent_vec, origin, cands, _ = parent
+            if cands is None and vectors is not None and hits:
+                cands = vectors(hits)
+                if cands is not None:
+                    cands = np.asarray(cands, dtype=np.float32)
+                    with self._lock:
+                        self._put(parent_key, hits, parent_vec, origin, cands)   # later reuses skip the fetch
+            if cands is not None:
+                results, cands = _rescore(hits, cands, vec)
+                with self._lock:
+                    self.prefix_reuses += 1
+        if results is None:
+            results = search(vec.tolist())
+            cands = _vectors(results)
+            origin = vec
+            with self._lock:
+                self.searches += 1
+
+        with self._lock:
+            self._put(key, results, vec, origin, cands)
+        return results, vec
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = self.exact_hits + self.prefix_reuses
+            return {
+                "entries": len(self._data),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "prefix_reuses": self.prefix_reuses,
+                "searches": self.searches,
+                "hit_rate": served / self.lookups if self.lookups else 0.0,
+            }
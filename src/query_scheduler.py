@@ -0,0 +1,100 @@
+"""
+Server-side debounce and request coalescing for keystroke queries.
+
+A fast typist starts an embed + vector search per character and throws
+most results away. QueryScheduler.run() sits in front of that work:
+
+    * debounce: each call waits up to the latency budget; a newer call
+      from the same session supersedes it and it returns without running;
+    * cancellation: a call that was superseded while its work ran drops
+      the stale result instead of rendering it;
+    * coalescing: identical normalized queries in flight from different
+      sessions share one computation.
+
+The latency budget is the trade-off knob: a larger budget skips more
+intermediate keystrokes but adds that much delay before the first result.
+
+The debounce only works for callers whose requests overlap (threads, a
+service). Streamlit runs one session's reruns one at a time, so
+streamlit_ui debounces in the browser (st_keyup debounce=) and uses a
+zero budget here, keeping only the coalescing.
+"""
+import itertools
+import threading
+from concurrent.futures import Future
+
+from embedding_cache import normalize_text
+
+LATENCY_BUDGET_MS = 150
+
+class Superseded(Exception):
+    """A newer query from the same session replaced this one."""
+
+class QueryScheduler:
+    def __init__(self, budget_ms: float = LATENCY_BUDGET_MS):
+        self.budget = budget_ms / 1000.0
+        self._cond = threading.Condition()
+        self._latest = {}      # session_id -> newest generation
+        self._generations = itertools.count(1)   # global, a generation is never reused
+        self._inflight = {}    # normalized query -> Future
+        self.submitted = 0
+        self.superseded = 0
+        self.coalesced = 0
+        self.executed = 0
+
+    def _is_latest(self, session_id, gen):
+        return self._latest.get(session_id) == gen
+
+    def run(self, session_id, query: str, fn):
+        """
+        Run fn(query) for session_id, honouring debounce and coalescing.
+        Raises Superseded when a newer query from the session took over.
+        """
+        key = normalize_text(query)
+        with self._cond:
+            self.submitted += 1
+            gen = next(self._generations)
+            self._latest[session_id] = gen
+            self._cond.notify_all()
+            # debounce: wake early if this session types again
+            self._cond.wait_for(lambda: not self._is_latest(session_id, gen), timeout=self.budget)
+            if not self._is_latest(session_id, gen):
+                self.superseded += 1
+                raise Superseded(query)
+
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = Future()
+                self._inflight[key] = fut
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if owner:
+            try:
+                fut.set_result(fn(query))
+            except Exception as e:
+                fut.set_exception(e)
+            finally:
+                with self._cond:
+                    del self._inflight[key]
+        result = fut.result()
+
+        with self._cond:
+            if not self._is_latest(session_id, gen):
+                # the work finished, but a newer keystroke already owns the screen
+                self.superseded += 1
+                raise Superseded(query)
+        return result
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "superseded": self.superseded,
+                "coalesced": self.coalesced,
+                "executed": self.executed,
+                # model + DB round trips per typed character (1.0 without the scheduler)
+                "calls_per_keystroke": self.executed / self.submitted if self.submitted else 0.0,
+            }
@@ -1,17 +1,39 @@
 import streamlit as st
+import requests
 import embedding_generator
+import vector_index
+import vector_codec
+import atlas_search
+import query_cache
+import query_scheduler
+import prefix_index
+import lexical_index
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv, find_dotenv
 from st_keyup import st_keyup
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 load_dotenv() 
 
 URI_PROTOCOL = "mongodb+srv://"
 DB_NAME = "MLautoCompletionSystem"
 COLL_NAME = "embeddings-collection"
-VECTOR_INDEX = "vector_index_embeddings_key"     # must match your Atlas vector index name
 VECTOR_LIMIT = 10
+# 'atlas' runs $vectorSearch on the cluster, 'local' answers from an in-process index
+VECTOR_BACKEND = os.getenv("vector_backend", "atlas").lower()
+# 'lean' results carry only id/text/score; 'full' also ships the stored vectors (diagnostics)
+RESULT_SHAPE = os.getenv("vector_result_shape", "lean").lower()
+# how long the browser waits for the next keystroke before sending the value (st_keyup debounce)
+QUERY_BUDGET_MS = float(os.getenv("query_budget_ms", query_scheduler.LATENCY_BUDGET_MS))
+# inputs up to this many characters are completed lexically (prefix_index.py), the
+# embedding of 1-3 characters is close to noise; longer inputs go to vector search
+PREFIX_MAX_CHARS = int(os.getenv("prefix_max_chars", "3"))
+# 'vector' ranks by $vectorSearch alone, 'hybrid' fuses it with a local BM25 index (lexical_index.py)
+RETRIEVAL_MODE = os.getenv("retrieval_mode", "vector").lower()
+# set to e.g. http://127.0.0.1:8000 to run as a thin client of suggest_service.py
+# (the model and index then live in the service, shared with other frontends)
+SUGGEST_URL = os.getenv("suggest_url")
 mongo_connection_url = os.getenv("mongo_connection_url")
 user_pass= os.getenv("user_pass")
 user_name=os.getenv("user_name")
@@ -42,69 +64,129 @@ st.markdown("""
 
 st.header("🚀 Sentence Recommendation System")
 
+@st.cache_resource
+def get_result_cache():
+    # shared by every session, so one user's typing warms it for the next
+    return query_cache.PrefixResultCache()
+
+@st.cache_resource
+def get_scheduler():
+    # a session's reruns run one at a time, so a server-side wait never sees the next
+    # keystroke; the debounce happens in the browser and this only coalesces sessions
+    return query_scheduler.QueryScheduler(budget_ms=0)
+
 def run_ui():
     # st.title("Lightning Semantic Search")
-    query = st_keyup("Search for something...", key="interactive_input")
+    query = st_keyup("Search for something...", key="interactive_input", debounce=int(QUERY_BUDGET_MS) or None)
 
-    if query:
-        query_embedding = embedding_generator.get_embedding(query)
-        results = vector_query(query_embedding)
+    if query and len(query.strip()) <= PREFIX_MAX_CHARS:
+        # microsecond lookup, no encode, no $vectorSearch and no debounce needed
+        results = load_prefix_index().query(query, VECTOR_LIMIT)
+        with st.expander("Realtime Generated Embeddings Statistics"):
+            st.write(f"Prefix completion ({len(query.strip())} chars): "
+                     f"{[w for w, _ in load_prefix_index().complete_words(query.strip(), 5)]}")
+            st.write(f"Length of Find Result: {len(results)}")
+        show_results(results)
+    elif query:
+        # repeated prefixes and tiny keystroke changes are served from the result cache;
+        # the scheduler shares one search between sessions typing the same query
+        if SUGGEST_URL:
+            search = remote_suggest
+        else:
+            vector_search = lambda q: get_result_cache().get_or_search(
+                q, embedding_generator.get_embedding, vector_query, hit_vectors)
+            if RETRIEVAL_MODE == "hybrid":
+                # BM25 runs alongside the embed + vector search, then reciprocal-rank fusion
+                search = lambda q: lexical_index.hybrid_search(q, vector_search, load_lexical_index(), VECTOR_LIMIT)
+            else:
+                search = vector_search
+        try:
+            results, query_embedding = get_scheduler().run(get_script_run_ctx().session_id, query, search)
+        except query_scheduler.Superseded:
+            st.stop()
 
         with st.expander("Realtime Generated Embeddings Statistics"):
-            st.write(f"Vector Dimensions: {len(query_embedding)}")
+            if SUGGEST_URL:
+                st.write(f"Suggest service: {SUGGEST_URL}")
+            else:
+                st.write(f"Vector Dimensions: {len(query_embedding)}")
             st.write(f"Length of Find Result: {len(results)}")
+            if not SUGGEST_URL:
+                st.write(f"Embedding cache: {embedding_generator.get_cache().stats()}")
+                st.write(f"Result cache: {get_result_cache().stats()}")
+            st.write(f"Query scheduler: {get_scheduler().stats()}")
             st.json(results) 
 
-        with st.spinner("Searching MongoDB Atlas..."):
-            if results:
-                # We iterate through the results which are already sorted descending by MongoDB
-                # for item in results:
-                #     score = item["score"]
-                #     text = item["text"]
-                #     st.markdown(f"**Score:** `{score:.4f}` - {text}")
-
-                st.dataframe(
-                results,
-                column_order=("score", "text"),
-                column_config={
-                    "score": st.column_config.ProgressColumn(
-                        "Relevance",
-                        help="Vector Search Similarity Score",
-                        format="%.4f",
-                        min_value=0.0,
-                        max_value=1.0,
-                        color="auto"
-                    ),
-                    "text": st.column_config.TextColumn("Matched Results", width="large"),
-                    "embedding": None
-                },
-                hide_index=True,
-                use_container_width=True
-                )
-            else:
-                st.info("No results found for your query.")
-
-def vector_query(vec):
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": VECTOR_INDEX, #name of the created index here
-                "path": "embedding", #name of document field
-                "queryVector": vec,
-                "numCandidates": VECTOR_LIMIT * 30,
-                "limit": VECTOR_LIMIT
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "text": 1,
-                "embedding": 1,  # include the document field to be scanned
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        }
-    ]
-    return list(collection.aggregate(pipeline))
+        show_results(results)
+
+def show_results(results):
+    with st.spinner("Searching MongoDB Atlas..."):
+        if results:
+            # We iterate through the results which are already sorted descending by MongoDB
+            # for item in results:
+            #     score = item["score"]
+            #     text = item["text"]
+            #     st.markdown(f"**Score:** `{score:.4f}` - {text}")
+
+            st.dataframe(
+            results,
+            column_order=("score", "text"),
+            column_config={
+                "score": st.column_config.ProgressColumn(
+                    "Relevance",
+                    help="Vector Search Similarity Score",
+                    format="%.4f",
+                    min_value=0.0,
+                    max_value=1.0,
+                    color="auto"
+                ),
+                "text": st.column_config.TextColumn("Matched Results", width="large"),
+                "embedding": None
+            },
+            hide_index=True,
+            use_container_width=True
+            )
+        else:
+            st.info("No results found for your query.")
+
+@st.cache_resource
+def get_http_session():
+    # one keep-alive connection pool to the suggest service for all sessions
+    return requests.Session()
+
+def remote_suggest(query: str):
+    r = get_http_session().post(f"{SUGGEST_URL.rstrip('/')}/suggest", json={"text": query, "k": VECTOR_LIMIT}, timeout=10)
+    r.raise_for_status()
+    return r.json()["results"], None
+
+@st.cache_resource
+def load_prefix_index():
+    return prefix_index.load_from_collection(collection)
+
+@st.cache_resource
+def load_lexical_index():
+    return lexical_index.load_from_collection(collection)
+
+@st.cache_resource
+def load_local_index():
+    # memory-maps the on-disk snapshot, scanning the collection only when it is stale
+    return vector_index.load_or_build(collection, embedding_generator.MODEL_ID)
+
+def vector_query(vec, include_vectors: bool = None):
+    if include_vectors is None:
+        include_vectors = RESULT_SHAPE == "full"
+    if VECTOR_BACKEND == "local":
+        return load_local_index().query(vec, VECTOR_LIMIT, include_vectors)
+
+    return atlas_search.query(collection, vec, VECTOR_LIMIT, include_vectors, candidates_per_result=30)
+
+def hit_vectors(hits):
+    # stored vectors of a result list, only fetched when the result cache re-scores a reused prefix
+    ids = [h["id"] for h in hits]
+    docs = {d["_id"]: d for d in collection.find({"_id": {"$in": ids}}, {"embedding": 1, "codec": 1})}
+    if len(docs) < len(set(ids)):
+        return None   # ObjectId-keyed legacy documents do not match the string ids
+    return vector_codec.decode_many(docs[i] for i in ids)
 
 if __name__ == "__main__":
     run_ui()
\ No newline at end of file
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Local suggestion service: one warm model process for many frontends.
+
+    python suggest_service.py [--host 127.0.0.1] [--port 8000] [--backend atlas|local]
+
+Endpoints:
+    POST /embed    {"input": str | [str]}            OpenAI-style embeddings response
+                   {"data": [{"embedding": [...], "index": i}], "model": ...}
+    POST /suggest  {"text": str, "k": int}          {"results": [{id, text, score}], "timings": {...}}
+    GET  /health   model, backend and cache / batching stats
+
+The model is loaded once per process. Concurrent requests go through
+embedding_generator's micro-batcher, so texts arriving within a few
+milliseconds of each other share one forward pass, and repeated texts come
+from the embedding cache. The vector search runs on a pluggable backend
+(VECTOR_BACKENDS) in a worker thread so the event loop keeps accepting
+requests.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from aiohttp import web
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+import atlas_search
+import embedding_generator
+import vector_index
+
+load_dotenv()
+
+URI_PROTOCOL = "mongodb+srv://"
+DB_NAME = "MLautoCompletionSystem"
+COLL_NAME = "embeddings-collection"
+VECTOR_LIMIT = 10
+MAX_K = 50
+MAX_INPUTS = 256          # texts per /embed request
+VECTOR_BACKEND = os.getenv("vector_backend", "atlas").lower()
+mongo_connection_url = os.getenv("mongo_connection_url")
+user_pass= os.getenv("user_pass")
+user_name=os.getenv("user_name")
+CONN_URL=f"{URI_PROTOCOL}{user_name}:{user_pass}{mongo_connection_url}"
+
+# ----------------------------
+# vector backends: search(vec, k, include_vectors) -> [{id, text, score(, embedding)}]
+# ----------------------------
+class AtlasBackend:
+    name = "atlas"
+
+    def __init__(self, coll):
+        self.coll = coll
+
+    def search(self, vec, k: int, include_vectors: bool = False):
+        return atlas_search.query(self.coll, vec, k, include_vectors, candidates_per_result=30)
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self, coll):
+        # memory-maps the on-disk snapshot, scanning the collection only when it is stale
+        self.index = vector_index.load_or_build(coll, embedding_generator.MODEL_ID)
+
+    def search(self, vec, k: int, include_vectors: bool = False):
+        return self.index.query(vec, k, include_vectors)
+
+VECTOR_BACKENDS = {"atlas": AtlasBackend, "local": LocalBackend}
+
+def make_backend(name: str = VECTOR_BACKEND, coll=None):
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend {name!r}, expected one of {sorted(VECTOR_BACKENDS)}")
+    if coll is None:
+        coll = MongoClient(CONN_URL)[DB_NAME][COLL_NAME]
+    return VECTOR_BACKENDS[name](coll)
+
+# ----------------------------
+# request handling
+# ----------------------------
+async def embed_one(text: str):
+    # cache first, then the shared micro-batcher (one forward pass for concurrent callers)
+    cache = embedding_generator.get_cache()
+    vec = cache.get(text)
+    if vec is None:
+        vec = await asyncio.wrap_future(embedding_generator.get_batcher().submit(text))
+        vec = cache.put(text, vec)   # a copy, not a row of the batcher's matrix
+    return vec
+
+def _bad_request(message: str):
+    return web.json_response({"error": message}, status=400)
+
+async def handle_embed(request: web.Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return _bad_request("body must be JSON")
+    inputs = body.get("input") if isinstance(body, dict) else None
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if not inputs or not all(isinstance(t, str) and t.strip() for t in inputs):
+        return _bad_request("input must be a non-empty string or list of non-empty strings")
+    if len(inputs) > MAX_INPUTS:
+        return _bad_request(f"at most {MAX_INPUTS} inputs per request")
+
+    vecs = await asyncio.gather(*(embed_one(t) for t in inputs))
+    data = [{"object": "embedding", "index": i, "embedding": v.tolist()} for i, v in enumerate(vecs)]
+    return web.json_response({"object": "list", "model": embedding_generator.MODEL_ID, "data": data})
+
+async def handle_suggest(request: web.Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return _bad_request("body must be JSON")
+    text = body.get("text") if isinstance(body, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return _bad_request("text must be a non-empty string")
+    try:
+        k = min(MAX_K, max(1, int(body.get("k", VECTOR_LIMIT))))
+    except (TypeError, ValueError):
+        return _bad_request("k must be an integer")
+
+    start = time.perf_counter()
+    vec = await embed_one(text)
+    embedded = time.perf_counter()
+    results = await asyncio.to_thread(request.app["backend"].search, vec.tolist(), k)
+    done = time.perf_counter()
+    return web.json_response({
+        "query": text,
+        "results": results,
+        "timings": {"embed_ms": round((embedded - start) * 1000, 2), "search_ms": round((done - embedded) * 1000, 2)},
+    })
+
+async def handle_health(request: web.Request):
+    return web.json_response({
+        "model": embedding_generator.MODEL_ID,
+        "backend": request.app["backend"].name,
+        "embedding_cache": embedding_generator.get_cache().stats(),
+    })
+
+def make_app(backend) -> web.Application:
+    app = web.Application()
+    app["backend"] = backend
+    app.router.add_post("/embed", handle_embed)
+    app.router.add_post("/suggest", handle_suggest)
+    app.router.add_get("/health", handle_health)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local /embed + /suggest service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backend", default=VECTOR_BACKEND, choices=sorted(VECTOR_BACKENDS))
+    args = parser.parse_args()
+
+    # warm up before accepting traffic so the first request does not pay the model load
+    embedding_generator.get_model()
+    embedding_generator.get_batcher()
+    backend = make_backend(args.backend)
+    print(f"Serving {embedding_generator.MODEL_ID} with the {backend.name} backend on http://{args.host}:{args.port}")
+    web.run_app(make_app(backend), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
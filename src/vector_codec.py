@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Compact storage codec for the `embedding` field.
+
+A Python list is stored as a BSON array: every element is a 64-bit double
+plus a type byte and a decimal string key ("0", "1", ...), about 3-4x the
+raw float32 payload. Vectors are instead packed into BSON binary:
+
+    float32  BSON vector (subtype 9, FLOAT32)  exact, Atlas-indexable
+    int8     BSON vector (subtype 9, INT8)     per-vector scale, Atlas-indexable
+    float16  generic binary (subtype 0)        half precision, NOT indexable
+                                                by Atlas (local index / archive)
+
+Documents carry codec = {"v": CODEC_VERSION, "dtype": ..., "scale": ...}.
+Documents without it are legacy lists. The int8 scale is one factor per
+vector (max |x| / 127), so cosine similarity, which Atlas computes on the
+raw int8 values, is unchanged apart from rounding.
+
+decode() returns float32 NumPy arrays. A float32 payload is viewed in
+place with np.frombuffer (zero-copy); int8 and float16 need one widening
+pass. decode_raw() returns the stored array itself plus its scale.
+
+    python vector_codec.py report [--dim 384]        bytes per vector / per result batch
+    python vector_codec.py migrate --dtype float32   rewrite legacy list documents
+"""
+import argparse
+import os
+import time
+
+import bson
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+
+CODEC_VERSION = 1
+CODECS = ("list", "float32", "int8", "float16")
+INDEXABLE = ("list", "float32", "int8")     # what an Atlas vector index accepts
+# codec for new writes; 'list' keeps the legacy array layout
+VECTOR_CODEC = os.getenv("vector_codec", "float32").lower()
+
+_VECTOR_HEADER = 2   # subtype 9 payload: dtype byte, padding byte, then the values
+
+def encode(vec, dtype: str = None):
+    """(stored value, codec metadata or None) for one vector."""
+    dtype = dtype or VECTOR_CODEC
+    if dtype not in CODECS:
+        raise ValueError(f"Unknown vector codec {dtype!r}, expected one of {CODECS}")
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    if dtype == "list":
+        return arr.tolist(), None
+    meta = {"v": CODEC_VERSION, "dtype": dtype}
+    if dtype == "float32":
+        return Binary.from_vector(arr, BinaryVectorDtype.FLOAT32), meta
+    if dtype == "int8":
+        peak = float(np.abs(arr).max()) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        q = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        meta["scale"] = scale
+        return Binary.from_vector(q, BinaryVectorDtype.INT8), meta
+    return Binary(arr.astype("<f2").tobytes(), 0), meta
+
+def decode_raw(value, meta=None):
+    """(stored array, scale) without widening; float32/int8/float16 views are zero-copy."""
+    if meta is None or isinstance(value, list):
+        return np.asarray(value, dtype=np.float32), 1.0
+    if meta.get("v", 1) > CODEC_VERSION:
+        raise ValueError(f"Vector codec version {meta['v']} is newer than this reader ({CODEC_VERSION})")
+    dtype = meta["dtype"]
+    if dtype == "float32":
+        return np.frombuffer(value, dtype="<f4", offset=_VECTOR_HEADER), 1.0
+    if dtype == "int8":
+        return np.frombuffer(value, dtype=np.int8, offset=_VECTOR_HEADER), meta["scale"]
+    if dtype == "float16":
+        return np.frombuffer(value, dtype="<f2"), 1.0
+    raise ValueError(f"Unknown vector codec {dtype!r}")
+
+def decode(value, meta=None) -> np.ndarray:
+    """float32 vector from a stored embedding (list or any codec)."""
+    raw, scale = decode_raw(value, meta)
+    if raw.dtype == np.float32:
+        return raw
+    out = raw.astype(np.float32)
+    if scale != 1.0:
+        out *= np.float32(scale)
+    return out
+
+def decode_doc(doc: dict, field: str = "embedding") -> np.ndarray:
+    return decode(doc[field], doc.get("codec"))
+
+def decode_many(docs, field: str = "embedding") -> np.ndarray:
+    """(n, dim) float32 matrix; rows are copied once into the result."""
+    docs = list(docs)
+    if not docs:
+        return np.empty((0, 0), dtype=np.float32)
+    first = decode_doc(docs[0], field)
+    out = np.empty((len(docs), len(first)), dtype=np.float32)
+    out[0] = first
+    for i, doc in enumerate(docs[1:], start=1):
+        out[i] = decode_doc(doc, field)
+    return out
+
+def decode_hits(hits, field: str = "embedding"):
+    # query results with vectors: packed embeddings back to plain lists, like the local index returns
+    for hit in hits:
+        if field in hit:
+            hit[field] = decode(hit[field], hit.pop("codec", None)).tolist()
+    return hits
+
+# ----------------------------
+# savings report
+# ----------------------------
+def encoded_size(vec, dtype: str) -> int:
+    # BSON bytes of {"embedding": ..., "codec": ...} as stored in a document
+    value, meta = encode(vec, dtype)
+    doc = {"embedding": value}
+    if meta:
+        doc["codec"] = meta
+    return len(bson.encode(doc))
+
+def savings_table(dim: int = 384, hits: int = 10):
+    rng = np.random.default_rng(0)
+    vec = rng.standard_normal(dim).astype(np.float32)
+    vec /= np.linalg.norm(vec)
+    base = encoded_size(vec, "list")
+    rows = []
+    for dtype in CODECS:
+        size = encoded_size(vec, dtype)
+        restored = decode(*encode(vec, dtype))
+        cos = float(np.dot(vec, restored) / (np.linalg.norm(restored) + 1e-12))
+        rows.append({"dtype": dtype, "bytes": size, "vs_list": size / base, "per_hit_batch": size * hits,
+                     "cosine": cos, "atlas_index": dtype in INDEXABLE})
+    return rows
+
+def print_savings(dim: int = 384, hits: int = 10):
+    print(f"dim={dim}; bytes of the embedding field (+ codec) per document, and per {hits}-hit result batch")
+    print(f"{'codec':>8} {'bytes':>7} {'vs list':>8} {f'x{hits} hits':>10} {'cosine':>8} {'indexable':>10}")
+    for r in savings_table(dim, hits):
+        print(f"{r['dtype']:>8} {r['bytes']:>7} {r['vs_list']:>8.2f} {r['per_hit_batch']:>10} "
+              f"{r['cosine']:>8.5f} {str(r['atlas_index']):>10}")
+
+# ----------------------------
+# migration of existing documents
+# ----------------------------
+def migrate(coll, dtype: str = None, batch_size: int = 1000, dry_run: bool = False):
+    """
+    Rewrite documents whose embedding is still a BSON array into `dtype`.
+    Streams the collection in batches and reports bytes before/after.
+    """
+    from pymongo import UpdateOne
+
+    dtype = dtype or VECTOR_CODEC
+    if dtype == "list":
+        raise ValueError("migrate converts lists to a packed codec, pick float32, int8 or float16")
+    if dtype not in INDEXABLE:
+        print(f"warning: {dtype} vectors are not indexable by Atlas $vectorSearch; use them with the local index only")
+
+    cursor = coll.find({"embedding": {"$type": "array"}}, {"embedding": 1}).batch_size(batch_size)
+    before = after = docs = 0
+    start = time.monotonic()
+    ops = []
+
+    def flush():
+        if ops and not dry_run:
+            coll.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for doc in cursor:
+        value, meta = encode(doc["embedding"], dtype)
+        before += len(bson.encode({"embedding": doc["embedding"]}))
+        after += len(bson.encode({"embedding": value, "codec": meta}))
+        docs += 1
+        ops.append(UpdateOne({"_id": doc["_id"], "embedding": {"$type": "array"}},
+                             {"$set": {"embedding": value, "codec": meta}}))
+        if len(ops) >= batch_size:
+            flush()
+            print(f"{'Checked' if dry_run else 'Migrated'} {docs} documents ({docs / (time.monotonic() - start):.0f}/s)")
+    flush()
+
+    saved = before - after
+    print(f"{'Dry run: would migrate' if dry_run else 'Migrated'} {docs} documents to {dtype}: "
+          f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB of vector data "
+          f"({saved / 1e6:.1f} MB saved, {after / before if before else 1:.2f}x)")
+    return {"docs": docs, "bytes_before": before, "bytes_after": after}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact vector storage: savings report and migration")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("report", help="bytes per stored vector and per result batch for every codec")
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--hits", type=int, default=10)
+    p = sub.add_parser("migrate", help="rewrite legacy list embeddings into a packed codec")
+    p.add_argument("--dtype", default=VECTOR_CODEC, choices=[c for c in CODECS if c != "list"])
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "report":
+        print_savings(args.dim, args.hits)
+    else:
+        import deduplicator
+        migrate(deduplicator.get_collection(), args.dtype, args.batch_size, args.dry_run)
+
+if __name__ == "__main__":
+    main()
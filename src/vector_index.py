@@ -0,0 +1,350 @@
+"""
+Local in-process vector index, an alternative to Atlas $vectorSearch.
+
+Small corpora use an exact brute-force scan over a normalized float32
+matrix (one matrix-vector product). Large ones use an IVF index: vectors
+are clustered with spherical k-means and a query only scans the lists of
+its nearest centroids. Either index is built from the embeddings
+collection or a local .npz dump and answers top-k from RAM.
+
+Scores follow Atlas' cosine convention, (1 + cosine) / 2, so results are
+interchangeable with vector_query output.
+
+An index can be saved as a versioned snapshot directory and mapped back
+with np.memmap, so a restart costs a file map instead of a collection scan:
+
+    header.json       format version, model id, kind, counts, source fingerprint, per-file size and crc32
+    vectors.f32       normalized (n, dim) float32 matrix, in list order for IVF
+    texts.bin         utf-8 texts back to back, text_offsets.i64 has n + 1 offsets
+    ids.bin           same layout for document ids (id_offsets.i64)
+    centroids.f32     IVF only: (nlist, dim) centroids
+    list_offsets.i64  IVF only: nlist + 1 row offsets, list l is rows [o[l], o[l+1])
+
+Every load checks all file sizes and the crc32 of the small structural
+files (offsets, centroids), where one flipped value would misroute whole
+lists or slice every later text wrongly. The big payloads (vectors, text
+and id blobs) are only checksummed with snapshot_verify=1: a corrupt byte
+there only damages its own row, and reading them all would cost what the
+memory map saves.
+"""
+import json
+import os
+import shutil
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+import bulk_writer
+import vector_codec
+
+BRUTE_FORCE_MAX = 50_000   # above this many vectors an IVF index is built
+IVF_NPROBE = 8             # lists scanned per query
+KMEANS_ITERS = 20
+KMEANS_SAMPLE_PER_LIST = 256
+
+def _normalize(mat):
+    mat = np.ascontiguousarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.clip(norms, 1e-12, None)
+
+def _topk(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+class TextTable:
+    """Read-only list of strings decoded on access from a utf-8 blob and offsets."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+def _as_table(values):
+    return values if isinstance(values, TextTable) else list(values)
+
+class BruteForceIndex:
+    kind = "flat"
+
+    def __init__(self, vectors, texts, ids=None, normalized: bool = False):
+        # normalized=True keeps the given matrix as-is (e.g. a memory-mapped snapshot)
+        self.vectors = vectors if normalized else _normalize(vectors)
+        self.texts = _as_table(texts)
+        self.ids = _as_table(ids) if ids is not None else None
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def search(self, vec, k: int):
+        """Row numbers and cosine similarities of the k nearest vectors."""
+        q = _normalize(vec)
+        sims = self.vectors @ q
+        rows = _topk(sims, k)
+        return rows, sims[rows]
+
+    def query(self, vec, k: int, include_vectors: bool = False):
+        # same shape as the Atlas vector_query: id/text/score, plus the vector on request
+        rows, sims = self.search(vec, k)
+        results = []
+        for r, s in zip(rows, sims):
+            hit = {"id": self.ids[r] if self.ids is not None else None,
+                   "text": self.texts[r],
+                   "score": float((1.0 + s) / 2.0)}
+            if include_vectors:
+                hit["embedding"] = self.vectors[r].tolist()
+            results.append(hit)
+        return results
+
+class IVFIndex(BruteForceIndex):
+    kind = "ivf"
+
+    def __init__(self, vectors, texts, ids=None, nlist: int = None, nprobe: int = IVF_NPROBE,
+                 centroids=None, offsets=None, normalized: bool = False):
+        """
+        With centroids/offsets given, vectors/texts/ids must already be in
+        list order (as saved by a snapshot); otherwise they are clustered here.
+        """
+        super().__init__(vectors, texts, ids, normalized)
+        self.nprobe = nprobe
+        if centroids is not None:
+            self.centroids = centroids if normalized else _normalize(centroids)
+            self.offsets = np.asarray(offsets, dtype=np.int64)
+            return
+
+        nlist = min(nlist or max(1, int(4 * np.sqrt(len(self.vectors)))), len(self.vectors))
+        self.centroids = _kmeans(self.vectors, nlist)
+        assign = _assign(self.vectors, self.centroids)
+        # store every list contiguously so a probe is one slice
+        order = np.argsort(assign, kind="stable")
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self.texts = [self.texts[i] for i in order]
+        if self.ids is not None:
+            self.ids = [self.ids[i] for i in order]
+        counts = np.bincount(assign, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def search(self, vec, k: int):
+        q = _normalize(vec)
+        lists = _topk(self.centroids @ q, self.nprobe)
+        spans = [(self.offsets[l], self.offsets[l + 1]) for l in lists]
+        rows = np.concatenate([np.arange(a, b) for a, b in spans])
+        sims = np.concatenate([self.vectors[a:b] @ q for a, b in spans])
+        best = _topk(sims, k)
+        return rows[best], sims[best]
+
+def _assign(vectors, centroids, block: int = 65536):
+    # nearest centroid per vector, in blocks to bound the score matrix
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        out[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return out
+
+def _kmeans(vectors, nlist: int, iters: int = KMEANS_ITERS, seed: int = 0):
+    # spherical k-means on a sample, enough to place the centroids
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        # re-seed empty lists with random sample points
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+def build_index(vectors, texts, ids=None, kind: str = "auto"):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == "auto":
+        kind = "flat" if len(vectors) <= BRUTE_FORCE_MAX else "ivf"
+    if kind == "ivf":
+        return IVFIndex(vectors, texts, ids)
+    return BruteForceIndex(vectors, texts, ids)
+
+# ----------------------------
+# sources
+# ----------------------------
+def load_from_collection(coll, kind: str = "auto", batch_size: int = 2000):
+    """Scan the embeddings collection once and build an index from it."""
+    texts, ids, vectors = [], [], []
+    cursor = coll.find({"embedding": {"$exists": True}}, {"text": 1, "embedding": 1, "codec": 1}).batch_size(batch_size)
+    for doc in cursor:
+        if not doc.get("text"):
+            continue
+        texts.append(doc["text"])
+        ids.append(str(doc["_id"]))
+        vectors.append(vector_codec.decode_doc(doc))
+    if not vectors:
+        raise ValueError("No embedded documents found to build a local index from")
+    return build_index(np.stack(vectors), texts, ids, kind)
+
+def save_dump(path, vectors, texts, ids=None):
+    np.savez(path, vectors=np.asarray(vectors, dtype=np.float32), texts=np.array(texts, dtype=object),
+             ids=np.array(ids if ids is not None else [], dtype=object))
+
+def load_from_dump(path, kind: str = "auto"):
+    with np.load(path, allow_pickle=True) as data:
+        ids = list(data["ids"]) or None
+        return build_index(data["vectors"], list(data["texts"]), ids, kind)
+
+# ----------------------------
+# snapshots
+# ----------------------------
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = Path(__file__).parent / "cache" / "index"
+# snapshot_verify=1 also re-checks the crc32 of the big payload files on load;
+# by default only the small structural files are read (see the module docstring)
+SNAPSHOT_VERIFY = os.getenv("snapshot_verify", "0") == "1"
+ALWAYS_VERIFIED = ("text_offsets.i64", "id_offsets.i64", "centroids.f32", "list_offsets.i64")
+
+class SnapshotError(ValueError):
+    pass
+
+def _crc32(path: Path, chunk: int = 1 << 20) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+def _pack_strings(values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+def source_fingerprint(coll) -> dict:
+    """
+    Collection size plus the newest document's ts. Deletes balanced by the
+    same number of inserts keep the count but bring a newer ts.
+    """
+    newest = coll.find_one({}, {"ts": 1}, sort=[("ts", -1)])
+    return {"count": coll.estimated_document_count(), "newest_ts": newest.get("ts") if newest else None}
+
+def save_snapshot(index, path: Path, model_id: str, source: dict = None):
+    """
+    Write index to the snapshot directory `path`. The new snapshot is built
+    next to the old one and swapped in, so readers never see a partial write.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    files = {"vectors.f32": np.ascontiguousarray(index.vectors, dtype=np.float32).tobytes()}
+    blob, offsets = _pack_strings(index.texts)
+    files["texts.bin"], files["text_offsets.i64"] = blob, offsets.tobytes()
+    if index.ids is not None:
+        blob, offsets = _pack_strings(index.ids)
+        files["ids.bin"], files["id_offsets.i64"] = blob, offsets.tobytes()
+    if index.kind == "ivf":
+        files["centroids.f32"] = np.ascontiguousarray(index.centroids, dtype=np.float32).tobytes()
+        files["list_offsets.i64"] = index.offsets.astype(np.int64).tobytes()
+
+    for name, data in files.items():
+        with open(tmp / name, "wb") as f:
+            f.write(data)
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "model_id": model_id,
+        "kind": index.kind,
+        "count": len(index),
+        "dim": int(index.dim),
+        "nlist": int(len(index.centroids)) if index.kind == "ivf" else 0,
+        "nprobe": getattr(index, "nprobe", None),
+        "source": source,
+        "files": {name: {"size": len(data), "crc32": zlib.crc32(data)} for name, data in files.items()},
+    }
+    with open(tmp / "header.json", "w") as f:
+        json.dump(header, f, indent=4)
+
+    old = path.with_name(path.name + ".old")
+    if path.exists():
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+def read_snapshot_header(path: Path) -> dict:
+    with open(Path(path) / "header.json") as f:
+        return json.load(f)
+
+def load_snapshot(path: Path, model_id: str, verify: bool = SNAPSHOT_VERIFY):
+    """
+    Map a snapshot back into an index without copying the vectors.
+    Raises SnapshotError when the format version or model id do not match,
+    or when a file's size, or the crc32 of a structural file (of every file
+    with verify=True), disagrees with the header.
+    """
+    path = Path(path)
+    header = read_snapshot_header(path)
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Snapshot version {header.get('version')} != {SNAPSHOT_VERSION}")
+    if header.get("model_id") != model_id:
+        raise SnapshotError(f"Snapshot built for model {header.get('model_id')!r}, expected {model_id!r}")
+    for name, meta in header["files"].items():
+        fpath = path / name
+        if not fpath.exists() or fpath.stat().st_size != meta["size"]:
+            raise SnapshotError(f"Snapshot file {name} is missing or truncated")
+        if (verify or name in ALWAYS_VERIFIED) and _crc32(fpath) != meta["crc32"]:
+            raise SnapshotError(f"Snapshot file {name} failed its checksum")
+
+    def _map(name, dtype, shape=None):
+        if header["files"][name]["size"] == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path / name, dtype=dtype, mode="r", shape=shape)
+
+    n, dim = header["count"], header["dim"]
+    vectors = _map("vectors.f32", np.float32, (n, dim))
+    texts = TextTable(_map("texts.bin", np.uint8), _map("text_offsets.i64", np.int64))
+    ids = None
+    if "ids.bin" in header["files"]:
+        ids = TextTable(_map("ids.bin", np.uint8), _map("id_offsets.i64", np.int64))
+
+    if header["kind"] == "ivf":
+        centroids = _map("centroids.f32", np.float32, (header["nlist"], dim))
+        return IVFIndex(vectors, texts, ids, nprobe=header.get("nprobe") or IVF_NPROBE,
+                        centroids=centroids, offsets=_map("list_offsets.i64", np.int64), normalized=True)
+    return BruteForceIndex(vectors, texts, ids, normalized=True)
+
+def load_or_build(coll, model_id: str, path: Path = None, verify: bool = SNAPSHOT_VERIFY):
+    """
+    Fast start for the local backend: map the snapshot when it matches the
+    model and the collection fingerprint, otherwise scan the collection and
+    save a fresh snapshot for the next start.
+    """
+    path = Path(path) if path is not None else SNAPSHOT_DIR / model_id
+    bulk_writer.ensure_ts_index(coll)   # the fingerprint's newest-ts lookup would scan without it
+    source = source_fingerprint(coll)
+    try:
+        if read_snapshot_header(path).get("source") == source:
+            return load_snapshot(path, model_id, verify)
+        print("Local index snapshot is out of date, rebuilding from the collection...")
+    except FileNotFoundError:
+        print("No local index snapshot found, building from the collection...")
+    except (SnapshotError, KeyError, json.JSONDecodeError) as e:
+        print(f"Rejected local index snapshot: {e}")
+
+    index = load_from_collection(coll)
+    save_snapshot(index, path, model_id, source)
+    return index
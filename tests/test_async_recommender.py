@@ -0,0 +1,55 @@
+import asyncio
+
+import bulk_writer
+import dev_fakes
+import main
+
+CORPUS = ["iron man builds a suit", "thor calls lightning", "hulk smashes the city"]
+
+def _collection(dim=32):
+    # searches run alongside the background store, so the texts are there up front
+    return dev_fakes.FakeAsyncCollection([bulk_writer.make_doc(t, dev_fakes.fake_vector(t, dim)) for t in CORPUS])
+
+def test_async_main_against_local_fakes(monkeypatch, capsys):
+    seeds = ["thor calls lightning", "wakanda forever"]
+
+    async def ainput(prompt=""):
+        await asyncio.sleep(0.2)   # let the previous seed finish
+        if not seeds:
+            raise EOFError
+        return seeds.pop(0)
+
+    monkeypatch.setattr(main.aioconsole, "ainput", ainput)
+    coll = _collection()
+    with dev_fakes.FakeEmbedServer(dim=32) as server:
+        try:
+            asyncio.run(main.async_main(server.url, coll))
+        except EOFError:
+            pass
+
+    assert sorted(d["text"] for d in coll.docs.values()) == sorted(CORPUS + ["wakanda forever"])
+    out = capsys.readouterr().out
+    assert "--- matches from DB for 'thor calls lightning' ---" in out
+    assert "[DB] thor calls lightning" in out
+
+def test_a_newer_seed_cancels_the_one_in_flight():
+    async def scenario(server):
+        async with main.AsyncRecommender(server.url, _collection(), store=False) as rec:
+            first = asyncio.create_task(rec.handle("iron"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            hits = await rec.handle("hulk smashes the city")
+        return first, hits
+
+    with dev_fakes.FakeEmbedServer(dim=32, delay=0.2) as server:
+        first, hits = asyncio.run(scenario(server))
+    assert first.cancelled()
+    assert hits[0]["text"] == "hulk smashes the city"
+
+def test_store_sentence_is_insert_once():
+    async def scenario():
+        rec = main.AsyncRecommender("unused", dev_fakes.FakeAsyncCollection(), session=object())
+        vec = dev_fakes.fake_vector("hulk smash", 8)
+        return [await rec.store_sentence("hulk smash", vec) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [True, False]
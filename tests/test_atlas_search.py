@@ -0,0 +1,28 @@
+import asyncio
+
+import numpy as np
+
+import atlas_search
+import bulk_writer
+import dev_fakes
+
+CORPUS = ["iron man builds a suit", "thor calls lightning", "hulk smashes the city"]
+
+def _collection(dim=16):
+    return dev_fakes.FakeAsyncCollection([bulk_writer.make_doc(t, dev_fakes.fake_vector(t, dim)) for t in CORPUS])
+
+def test_lean_pipeline_ships_no_vectors():
+    stages = atlas_search.pipeline([0.0] * 4, 5)
+    assert stages[0]["$vectorSearch"]["index"] == atlas_search.VECTOR_SEARCH_INDEX
+    assert stages[0]["$vectorSearch"]["numCandidates"] == 5 * atlas_search.CANDIDATES_PER_RESULT
+    assert "embedding" not in stages[1]["$project"]
+
+def test_query_async_decodes_packed_vectors():
+    vec = dev_fakes.fake_vector("thor calls lightning", 16)
+    lean = asyncio.run(atlas_search.query_async(_collection(), vec, 2))
+    full = asyncio.run(atlas_search.query_async(_collection(), vec, 2, include_vectors=True))
+
+    assert [h["text"] for h in lean] == [h["text"] for h in full]
+    assert lean[0]["text"] == "thor calls lightning" and "embedding" not in lean[0]
+    assert "codec" not in full[0]
+    assert np.allclose(full[0]["embedding"], vec, atol=1e-6)
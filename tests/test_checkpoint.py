@@ -0,0 +1,52 @@
+import json
+
+from pymongo.errors import BulkWriteError
+
+import bulk_writer
+import checkpoint
+
+def test_parked_batch_does_not_stall_the_checkpoint(tmp_path):
+    ckpt = checkpoint.Checkpoint("src", root=tmp_path)
+    applied = []
+    tracker = checkpoint.CommitTracker(
+        ckpt, lambda state, markers: applied.append(markers) or checkpoint.advance_offset(state, markers),
+        checkpoint.DeadLetters("src", root=tmp_path), checkpoint.advance_offset)
+    seqs = [tracker.register([10 * (i + 1)]) for i in range(3)]
+
+    tracker.commit(seqs[0])
+    tracker.give_up(seqs[1], ["bad text"], "embed error: boom")
+    tracker.commit(seqs[2])
+
+    assert ckpt.state["offset"] == 30
+    assert tracker.pending() == 0
+    assert applied == [[10], [30]]   # the parked batch moved the offset without counting as written
+    parked = [json.loads(line) for line in (tmp_path / "src.dead.jsonl").read_text().splitlines()]
+    assert [(p["texts"], p["markers"]) for p in parked] == [(["bad text"], [20])]
+
+def test_without_dead_letters_a_failed_batch_stays_pending(tmp_path):
+    tracker = checkpoint.CommitTracker(checkpoint.Checkpoint("src", root=tmp_path), checkpoint.advance_offset)
+    first, second = tracker.register([1]), tracker.register([2])
+    tracker.give_up(first, ["x"], "write failed")
+    tracker.commit(second)
+    assert tracker.pending() == 2
+
+class RejectingCollection:
+    # fails every upsert of the text "bad" with a non-transient error
+    def bulk_write(self, ops, ordered=False):
+        bad = [i for i, op in enumerate(ops) if op._doc["$setOnInsert"]["text"] == "bad"]
+        if not bad:
+            return type("Result", (), {"upserted_count": len(ops), "matched_count": 0})()
+        raise BulkWriteError({"nUpserted": len(ops) - len(bad), "nMatched": 0,
+                              "writeErrors": [{"index": i, "code": 121, "errmsg": "rejected"} for i in bad]})
+
+def test_batch_writer_reports_written_and_failed_tags():
+    committed, failed = [], []
+    writer = bulk_writer.BatchWriter(RejectingCollection(), max_retries=0,
+                                     on_commit=committed.append, on_failed=failed.extend)
+    for tag, text in [(0, "a"), (0, "bad"), (1, "b")]:
+        writer.add(text, [0.1, 0.2], tag)
+    metrics = writer.flush()
+
+    assert metrics["failed"] == 1
+    assert committed == [{0: 1, 1: 1}]
+    assert failed == [(0, "bad")]
@@ -0,0 +1,41 @@
+import json
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DIM = 3
+
+def fake_generator(model_dir):
+    # stands in for embedding_generator (torch/streamlit are not needed to drive the slot ring)
+    mod = types.ModuleType("embedding_generator")
+    mod.DISK_PATH = str(model_dir)
+    mod.physical_cores = lambda: 1
+    mod.model_id = lambda backend=None: f"fake-{backend}"
+    mod.get_embeddings = lambda texts, batch_size=None: np.array([[len(t), 0, 1] for t in texts], dtype=np.float32)
+    return mod
+
+def test_more_chunks_than_slots(tmp_path, monkeypatch):
+    (tmp_path / "config.json").write_text(json.dumps({"hidden_size": DIM}))
+    monkeypatch.setitem(sys.modules, "embedding_generator", fake_generator(tmp_path))
+    monkeypatch.delitem(sys.modules, "embed_pool", raising=False)
+    import embed_pool
+
+    embedder = embed_pool.ProcessEmbedder(processes=1, batch_size=4, slots=2)
+    embedder._pool.shutdown()
+    embedder._pool = ThreadPoolExecutor(1)      # threads share the slot ring the workers would map
+    monkeypatch.setattr(embed_pool, "_slots", embedder._slots)
+
+    texts = ["x" * i for i in range(1, 13)]     # 3 chunks, 2 slots
+    result = {}
+    t = threading.Thread(target=lambda: result.setdefault("out", embedder.embed(texts)), daemon=True)
+    t.start()
+    t.join(5)
+    try:
+        assert not t.is_alive(), "embed() deadlocked waiting for a slot"
+        assert result["out"][:, 0].tolist() == [float(len(s)) for s in texts]
+        assert embedder._free.qsize() == 2
+    finally:
+        embedder.close()
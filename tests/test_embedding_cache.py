@@ -0,0 +1,13 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+def test_put_copies_rows_of_a_batch():
+    batch = np.ones((64, 384), dtype=np.float32)
+    cache = EmbeddingCache()
+    stored = cache.put("iron man", batch[3])
+
+    assert stored.base is None and stored.flags.owndata    # the 64-row matrix is not kept alive
+    assert cache.stats()["bytes"] == 384 * 4
+    batch[3] = 0
+    assert cache.get("Iron  Man")[0] == 1.0
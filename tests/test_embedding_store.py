@@ -0,0 +1,19 @@
+import numpy as np
+
+import embedding_store
+
+def test_reader_opened_before_the_store_existed(tmp_path):
+    reader = embedding_store.EmbeddingStore("m", root=tmp_path)   # no meta.json yet
+    writer = embedding_store.EmbeddingStore("m", root=tmp_path)
+    vecs = np.arange(6, dtype=np.float32).reshape(2, 3)
+    writer.append(["a", "b"], vecs)
+
+    assert np.array_equal(reader.get("b"), vecs[1])
+    assert reader.matrix().shape == (2, 3)
+
+def test_rows_appended_after_a_read_are_visible(tmp_path):
+    store = embedding_store.EmbeddingStore("m", root=tmp_path)
+    store.append(["a"], np.ones((1, 4), dtype=np.float32))
+    assert store.matrix().shape == (1, 4)
+    out = store.get_or_compute(["a", "b", "c"], lambda texts: np.full((len(texts), 4), 2, dtype=np.float32))
+    assert out.tolist() == [[1] * 4, [2] * 4, [2] * 4]
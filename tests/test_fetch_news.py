@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+import dev_fakes
+import fetch_news
+import news_log
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    log = news_log.NewsLog(root=tmp_path)
+    monkeypatch.setattr(fetch_news, "_log", log)
+    return log
+
+def _poll_until(server, stop_when, scheduler):
+    stop = threading.Event()
+    added = []
+
+    def on_added(n):
+        added.append(n)
+        if stop_when(added):
+            stop.set()
+
+    poller = threading.Thread(target=fetch_news.run_polling,
+                              kwargs={"stop": stop, "scheduler": scheduler, "on_added": on_added})
+    poller.start()
+    poller.join(10)
+    stop.set()
+    return poller, added
+
+def test_polling_survives_malformed_payloads(log, monkeypatch):
+    scheduler = fetch_news.PollScheduler(min_interval=0.01, max_interval=0.01, backoff_base=0.01, max_backoff=0.01)
+    with dev_fakes.FakeNewsServer(dev_fakes.make_articles(5), page_size=10) as server:
+        monkeypatch.setattr(fetch_news, "NEWS_API_URL", server.url)
+        server.reply_next({"status": "success", "results": {"not": "a list"}})
+        server.reply_next(["not", "an", "object"])
+        server.reply_next({"status": "success", "results": ["not an article"]})
+        poller, added = _poll_until(server, lambda added: sum(added) >= 5, scheduler)
+
+    assert not poller.is_alive()
+    assert sum(added) == 5 and len(log) == 5
+    assert len(server.requests) == 4   # three bad replies, then the real page
+
+def test_polling_honours_retry_after_and_follows_pages(log, monkeypatch):
+    scheduler = fetch_news.PollScheduler(min_interval=0.01, max_interval=0.01, backoff_base=0.01, max_backoff=0.01)
+    with dev_fakes.FakeNewsServer(dev_fakes.make_articles(25), page_size=10, failures=[(429, "0")]) as server:
+        monkeypatch.setattr(fetch_news, "NEWS_API_URL", server.url)
+        poller, added = _poll_until(server, lambda added: sum(added) >= 25, scheduler)
+
+    assert not poller.is_alive()
+    assert len(log) == 25
+    assert [r.get("page") for r in server.requests[1:4]] == [None, "10", "20"]
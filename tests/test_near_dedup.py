@@ -0,0 +1,39 @@
+import numpy as np
+
+import near_dedup
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+
+    def find(self, query, projection=None):
+        return [dict(self.docs[i]) for i in query["_id"]["$in"] if i in self.docs]
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_old_rows_in_a_cluster_are_never_reported():
+    # old A and B are not duplicates of each other (cos 0.93), new C is ~0.98 to both
+    theta = np.arccos(0.93)
+    a = _unit([1, 0, 0, 0])
+    b = _unit([np.cos(theta), np.sin(theta), 0, 0])
+    c = _unit(a + b)
+    z = _unit([0, 0, 1, 0])
+    texts = {
+        "a": "Iron Man builds a new suit in his lab tonight",
+        "b": "Iron Man builds a new suit in his lab today",
+        "c": "Iron Man builds a new suit in his lab tonight!",
+        "z": "Black Panther protects Wakanda from invaders",
+    }
+    coll = FakeCollection([{"_id": "a", "embedding": a.tolist()}, {"_id": "b", "embedding": b.tolist()}])
+
+    state = near_dedup.NearDupState("test", root="/nonexistent")
+    state.add(near_dedup.band_keys(near_dedup.minhash([texts["a"], texts["b"]])), ["a", "b"], 1.0)
+    new = [{"_id": "c", "text": texts["c"], "embedding": c, "ts": 2.0},
+           {"_id": "z", "text": texts["z"], "embedding": z, "ts": 3.0}]
+
+    found = near_dedup._process_chunk(coll, state, new, 0.95)
+
+    assert [(d["_id"], d["kept"]) for d in found] == [("c", "a")]
+    assert state.ids == ["a", "b", "z"]
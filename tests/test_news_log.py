@@ -0,0 +1,16 @@
+import json
+
+import news_log
+
+def test_open_log_imports_the_legacy_queue_once(tmp_path):
+    legacy = tmp_path / "news_queue.json"
+    legacy.write_text(json.dumps({
+        "a1": {"title": "One", "description": "first", "processed": True},
+        "a2": {"title": "Two", "description": "second", "processed": False},
+    }))
+    log = news_log.open_log(tmp_path / "log", legacy)
+    assert [r["article_id"] for r, _ in log.read_from(None)] == ["a1", "a2"]
+
+    log.append([{"article_id": "a3", "description": "third"}])
+    again = news_log.open_log(tmp_path / "log", legacy)   # not empty any more, nothing re-imported
+    assert len(again) == 3
@@ -0,0 +1,23 @@
+import prefix_index
+
+TEXTS = [
+    "Thor fights with the giants in the realm",
+    "Wakanda protects the vibranium with the king",
+    "Iron Man flies in the night with the suit",
+    "The team meets in the tower with Thor",
+    "Wakanda welcomes the team in the morning",
+    "Iron Man works with the team",
+]
+
+def test_short_prefixes_rank_content_words_above_stopwords():
+    index = prefix_index.PrefixIndex(TEXTS)
+    assert [w for w, _ in index.complete_words("W", 2)] == ["wakanda", "welcomes"]
+    assert [w for w, _ in index.complete_words("Th", 2)] == ["thor", "the"]
+    assert [w for w, _ in index.complete_words("i", 2)] == ["iron", "in"]
+
+def test_query_scores_stay_in_range_and_follow_the_ranking():
+    index = prefix_index.PrefixIndex(TEXTS)
+    results = index.query("th", 10)
+    assert results[0]["completion"] == "thor" and results[0]["score"] == 1.0
+    assert all(0 < r["score"] <= 1.0 for r in results)
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
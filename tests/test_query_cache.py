@@ -0,0 +1,65 @@
+import numpy as np
+
+from query_cache import PrefixResultCache
+
+def unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+# two stored sentences; "iron m" moves slightly towards the second one
+VECS = {"iron": unit([1.0, 0.0, 0.10]), "iron m": unit([1.0, 0.0, 0.16])}
+DOCS = {"a": unit([1.0, 0.20, 0.0]), "b": unit([1.0, 0.0, 0.45])}
+
+def search(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    hits = [{"id": i, "text": i, "score": float((1 + d @ vec) / 2), "embedding": d.tolist()} for i, d in DOCS.items()]
+    return sorted(hits, key=lambda h: h["score"], reverse=True)
+
+def lean(vec):
+    return [{k: v for k, v in h.items() if k != "embedding"} for h in search(vec)]
+
+def fetch(calls):
+    def vectors(hits):
+        calls.append([h["id"] for h in hits])
+        return np.stack([DOCS[h["id"]] for h in hits])
+    return vectors
+
+def test_prefix_reuse_rescores_for_the_new_query():
+    cache = PrefixResultCache()
+    cache.get_or_search("iron", VECS.get, search)
+    results, _ = cache.get_or_search("iron m", VECS.get, search)
+
+    assert cache.stats()["prefix_reuses"] == 1 and cache.stats()["searches"] == 1
+    fresh = search(VECS["iron m"])
+    assert [h["id"] for h in results] == [h["id"] for h in fresh]
+    assert np.allclose([h["score"] for h in results], [h["score"] for h in fresh], atol=1e-6)
+
+def test_lean_hits_fetch_vectors_once_per_search():
+    cache, calls = PrefixResultCache(), []
+    embed = {**VECS, "iron ma": unit([1.0, 0.0, 0.13])}.get
+    cache.get_or_search("iron", embed, lean, fetch(calls))
+    assert calls == []                      # nothing fetched until a prefix is reused
+    results, _ = cache.get_or_search("iron m", embed, lean, fetch(calls))
+    cache.get_or_search("iron ma", embed, lean, fetch(calls))
+
+    assert len(calls) == 1 and cache.stats()["prefix_reuses"] == 2 and cache.stats()["searches"] == 1
+    assert all("embedding" not in h for h in results)
+    assert np.allclose([h["score"] for h in results], [h["score"] for h in lean(VECS["iron m"])], atol=1e-6)
+
+def test_no_prefix_reuse_without_vectors():
+    cache = PrefixResultCache()
+    cache.get_or_search("iron", VECS.get, lean)
+    cache.get_or_search("iron m", VECS.get, lean)
+
+    assert cache.stats()["prefix_reuses"] == 0 and cache.stats()["searches"] == 2
+
+def test_reuse_is_checked_against_the_searched_vector():
+    # every keystroke is within 0.97 of the previous one, but drifts away from the first
+    angles = np.radians([0, 12, 24, 36])
+    embed = {q: unit([np.cos(a), np.sin(a), 0.0]) for q, a in zip(["iron", "iron m", "iron ma", "iron man"], angles)}.get
+    cache = PrefixResultCache()
+    for q in ["iron", "iron m", "iron ma", "iron man"]:
+        cache.get_or_search(q, embed, search)
+
+    # 12 deg reuses "iron"; 24 deg is too far from it, searches; 36 deg reuses that search
+    assert cache.stats()["searches"] == 2 and cache.stats()["prefix_reuses"] == 2
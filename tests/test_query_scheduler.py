@@ -0,0 +1,55 @@
+import threading
+
+import query_scheduler
+
+def _run_in_thread(scheduler, outcome, query, gate):
+    started = threading.Event()
+
+    def work(q):
+        started.set()
+        gate.wait(5)
+        return q
+
+    def target():
+        try:
+            outcome[query] = scheduler.run("s", query, work)
+        except query_scheduler.Superseded:
+            outcome[query] = "superseded"
+
+    t = threading.Thread(target=target)
+    t.start()
+    started.wait(5)
+    return t
+
+def test_stale_call_stays_superseded_when_generations_would_restart():
+    scheduler = query_scheduler.QueryScheduler(budget_ms=0)
+    outcome = {}
+    stale_gate, newest_gate = threading.Event(), threading.Event()
+    stale = _run_in_thread(scheduler, outcome, "iro", stale_gate)
+    # a newer keystroke finishes, then the newest one starts while "iro" still runs
+    assert scheduler.run("s", "iron", lambda q: q) == "iron"
+    newest = _run_in_thread(scheduler, outcome, "iron m", newest_gate)
+    stale_gate.set()
+    stale.join(5)
+    newest_gate.set()
+    newest.join(5)
+    assert outcome == {"iro": "superseded", "iron m": "iron m"}
+
+def test_newest_call_wins_the_debounce():
+    scheduler = query_scheduler.QueryScheduler(budget_ms=200)
+    results = {}
+
+    def call(q):
+        try:
+            results[q] = scheduler.run("s", q, lambda x: x)
+        except query_scheduler.Superseded:
+            results[q] = None
+
+    t = threading.Thread(target=call, args=("ir",))
+    t.start()
+    while not scheduler.stats()["submitted"]:
+        pass
+    call("iro")
+    t.join(5)
+    assert results == {"ir": None, "iro": "iro"}
+    assert scheduler.stats()["executed"] == 1
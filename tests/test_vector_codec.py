@@ -0,0 +1,121 @@
+import bson
+import numpy as np
+import pytest
+from bson.binary import Binary
+
+import vector_codec
+
+VEC = np.random.default_rng(7).standard_normal(384).astype(np.float32)
+
+def _through_bson(vec, dtype):
+    # stored exactly as a document field, read back as pymongo would
+    value, meta = vector_codec.encode(vec, dtype)
+    doc = {"embedding": value}
+    if meta:
+        doc["codec"] = meta
+    return bson.decode(bson.encode(doc))
+
+@pytest.mark.parametrize("dtype, atol", [("list", 1e-7), ("float32", 0), ("float16", 2e-3), ("int8", None)])
+def test_round_trip_through_bson(dtype, atol):
+    out = vector_codec.decode_doc(_through_bson(VEC, dtype))
+    assert out.dtype == np.float32 and out.shape == VEC.shape
+    if atol is None:
+        # int8: at most half a quantization step off per value
+        atol = np.abs(VEC).max() / 127 / 2 + 1e-6
+    assert np.allclose(out, VEC, atol=atol, rtol=0)
+
+def test_int8_scale_and_cosine():
+    doc = _through_bson(VEC, "int8")
+    raw, scale = vector_codec.decode_raw(doc["embedding"], doc["codec"])
+    assert raw.dtype == np.int8 and np.abs(raw).max() == 127
+    assert scale == pytest.approx(np.abs(VEC).max() / 127)
+    out = vector_codec.decode_doc(doc)
+    assert np.dot(out, VEC) / (np.linalg.norm(out) * np.linalg.norm(VEC)) > 0.999
+
+def test_float32_payload_follows_the_vector_header():
+    value, meta = vector_codec.encode(VEC, "float32")
+    assert isinstance(value, Binary) and value.subtype == 9
+    assert len(value) == vector_codec._VECTOR_HEADER + VEC.nbytes
+    raw, _ = vector_codec.decode_raw(bson.decode(bson.encode({"e": value}))["e"], meta)
+    assert np.array_equal(raw, VEC)    # same bits, nothing shifted by the header bytes
+
+def test_float16_is_plain_binary():
+    value, _ = vector_codec.encode(VEC, "float16")
+    assert value.subtype == 0 and len(value) == VEC.size * 2
+
+def test_newer_codec_version_and_unknown_dtype_are_refused():
+    value, meta = vector_codec.encode(VEC, "float32")
+    with pytest.raises(ValueError, match="newer"):
+        vector_codec.decode(value, dict(meta, v=vector_codec.CODEC_VERSION + 1))
+    with pytest.raises(ValueError):
+        vector_codec.encode(VEC, "bfloat16")
+
+def test_decode_hits_returns_plain_lists():
+    hits = []
+    for dtype in ("list", "float32", "int8"):
+        value, meta = vector_codec.encode(VEC, dtype)
+        hit = {"id": dtype, "text": dtype, "score": 1.0, "embedding": value}
+        if meta:
+            hit["codec"] = meta
+        hits.append(hit)
+    hits.append({"id": "lean", "text": "lean", "score": 0.5})
+
+    out = vector_codec.decode_hits(hits)
+    for hit in out[:3]:
+        assert isinstance(hit["embedding"], list) and "codec" not in hit
+        assert np.allclose(hit["embedding"], VEC, atol=0.02)
+    assert "embedding" not in out[3]
+
+# ----------------------------
+# migrate
+# ----------------------------
+class _Cursor(list):
+    def batch_size(self, n):
+        return self
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+        self.writes = 0
+
+    @staticmethod
+    def _matches(doc, query):
+        for field, cond in query.items():
+            if isinstance(cond, dict) and "$type" in cond:
+                if (cond["$type"] == "array") != isinstance(doc.get(field), list):
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    def find(self, query=None, projection=None):
+        return _Cursor({"_id": d["_id"], "embedding": d["embedding"]}
+                       for d in self.docs.values() if self._matches(d, query or {}))
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            doc = self.docs.get(op._filter["_id"])
+            if doc is not None and self._matches(doc, op._filter):
+                doc.update(op._doc["$set"])
+                self.writes += 1
+
+def test_migrate_rewrites_only_legacy_lists(capsys):
+    packed, meta = vector_codec.encode(VEC, "int8")
+    coll = FakeCollection([
+        {"_id": "a", "embedding": VEC.tolist()},
+        {"_id": "b", "embedding": (VEC * 2).tolist()},
+        {"_id": "c", "embedding": packed, "codec": meta},   # already migrated
+    ])
+    stats = vector_codec.migrate(coll, "float32", batch_size=1)
+
+    assert stats["docs"] == 2 and coll.writes == 2
+    assert stats["bytes_after"] < stats["bytes_before"] / 2
+    assert coll.docs["c"]["codec"] == meta
+    for _id, scale in (("a", 1), ("b", 2)):
+        assert coll.docs[_id]["codec"]["dtype"] == "float32"
+        assert np.array_equal(vector_codec.decode_doc(coll.docs[_id]), VEC * scale)
+
+def test_migrate_dry_run_writes_nothing():
+    coll = FakeCollection([{"_id": "a", "embedding": VEC.tolist()}])
+    stats = vector_codec.migrate(coll, "float32", dry_run=True)
+    assert stats["docs"] == 1 and coll.writes == 0 and isinstance(coll.docs["a"]["embedding"], list)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import bulk_writer
+import vector_index
+
+class _Cursor(list):
+    def batch_size(self, n):
+        return self
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.clock = 0.0
+        self.indexes = set()
+
+    def create_index(self, keys, name=None, **kwargs):
+        self.indexes.add(name)
+
+    def insert(self, text, vec):
+        self.clock += 1
+        doc = bulk_writer.make_doc(text, vec)
+        doc["ts"] = self.clock
+        self.docs[doc["_id"]] = doc
+
+    def delete(self, text):
+        del self.docs[bulk_writer.content_id(text)]
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query=None, projection=None):
+        return _Cursor(dict(d) for d in self.docs.values())
+
+    def find_one(self, query=None, projection=None, sort=None):
+        docs = sorted(self.docs.values(), key=lambda d: d["ts"], reverse=True)
+        return dict(docs[0]) if docs else None
+
+def _vec(seed, dim=8):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+def test_snapshot_is_rebuilt_after_deletes_balanced_by_inserts(tmp_path):
+    coll = FakeCollection()
+    for i in range(5):
+        coll.insert(f"text {i}", _vec(i))
+    vector_index.load_or_build(coll, "m", tmp_path / "snap")
+
+    coll.delete("text 0")
+    coll.insert("text 5", _vec(5))
+    index = vector_index.load_or_build(coll, "m", tmp_path / "snap")
+    assert index.query(_vec(5), 1)[0]["text"] == "text 5"
+
+def test_load_or_build_creates_the_ts_index(tmp_path):
+    coll = FakeCollection()
+    coll.insert("text", _vec(0))
+    vector_index.load_or_build(coll, "m", tmp_path / "snap")
+    assert bulk_writer.TS_INDEX in coll.indexes
+
+def test_a_fresh_snapshot_maps_its_payload_without_checksumming(tmp_path, monkeypatch):
+    coll = FakeCollection()
+    for i in range(3):
+        coll.insert(f"text {i}", _vec(i))
+    vector_index.load_or_build(coll, "m", tmp_path / "snap")
+
+    crc = vector_index._crc32
+    def no_payload_crc(path, chunk=1 << 20):
+        if path.name not in vector_index.ALWAYS_VERIFIED:
+            raise AssertionError(f"crc32 of {path.name} computed on a default load")
+        return crc(path, chunk)
+    monkeypatch.setattr(vector_index, "_crc32", no_payload_crc)
+    monkeypatch.setattr(vector_index, "load_from_collection", lambda *a, **k: pytest.fail("rebuilt a fresh snapshot"))
+    index = vector_index.load_or_build(coll, "m", tmp_path / "snap")
+    assert len(index) == 3
+
+def test_corrupt_offsets_are_rejected_on_a_default_load(tmp_path):
+    coll = FakeCollection()
+    for i in range(3):
+        coll.insert(f"text {i}", _vec(i))
+    vector_index.load_or_build(coll, "m", tmp_path / "snap")
+
+    offsets = tmp_path / "snap" / "text_offsets.i64"
+    data = bytearray(offsets.read_bytes())
+    data[8] ^= 0x01     # same size, one offset off by one
+    offsets.write_bytes(bytes(data))
+    with pytest.raises(vector_index.SnapshotError, match="checksum"):
+        vector_index.load_snapshot(tmp_path / "snap", "m")